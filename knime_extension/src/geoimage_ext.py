@@ -15,4 +15,5 @@ category = knext.category(
 import util.knime_utils as knut
 import nodes.geoimageio
 import nodes.geoimagetransform
+import nodes.geoimageanalysis
 import nodes.geoimageview
\ No newline at end of file
@@ -0,0 +1,604 @@
+import knime_extension as knext
+import util.knime_utils as knut
+import util.cluster_utils as clut
+import util.focal_utils as fut
+import util.raster_utils as rut
+import util.stats_utils as stut
+import util.tiling as tiling
+
+__category = knext.category(
+    path="/community/geoimage",
+    level_id="geoimageanalysis",
+    name="GeoImage Analysis",
+    description="Nodes that analyze spatial image data.",
+    # starting at the root folder of the extension_module parameter in the knime.yml file
+    icon="icons/icon/TransformCategory.png",
+    after="geoimagetransform",
+)
+
+# Root path for all node icons in this file
+__NODE_ICON_PATH = "icons/icon/Transform/"
+
+
+############################################
+# Raster Statistics
+############################################
+
+@knext.node(
+    name="Raster Statistics",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "GeoImagetoTable.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster",
+    description="Raster image to describe.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_table(
+    name="Statistics Table",
+    description="""One row per band with the number of valid and nodata pixels, minimum, maximum, mean, 
+    standard deviation and the selected percentiles.""",
+)
+
+@knext.output_table(
+    name="Histogram Table",
+    description="One row per band and histogram bin with the bin range and the number of pixels.",
+)
+
+class RasterStatisticsNode:
+    percentiles = knext.StringParameter(
+        "Percentiles",
+        """Comma separated list of the percentiles (0-100) to compute e.g. "2,50,98". 
+        Percentiles are exact for 8 and 16 bit integer rasters and approximated with a mergeable 
+        quantile sketch otherwise.""",
+        default_value="2,25,50,75,98",
+    )
+
+    bins = knext.IntParameter(
+        "Number of histogram bins",
+        """The number of equally sized histogram bins between the minimum and maximum of each band. 
+        Histograms are exact for 8 and 16 bit integer rasters and approximated otherwise.""",
+        default_value=64,
+        min_value=1,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to compute the statistics of the row blocks in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    rows_per_chunk = knext.IntParameter(
+        "Rows per chunk",
+        "The number of rows whose partial statistics are computed at once.",
+        default_value=512,
+        min_value=1,
+    )
+
+    def _get_percentiles(self):
+        try:
+            values = [float(p) for p in self.percentiles.split(",") if p.strip()]
+        except ValueError:
+            raise knext.InvalidParametersError(
+                f"'{self.percentiles}' is not a valid list of percentiles. Enter numbers separated by a comma."
+            )
+        if any(p < 0 or p > 100 for p in values):
+            raise knext.InvalidParametersError("Percentiles must be between 0 and 100")
+        return values
+
+    def configure(self, configure_context, input_binary_schema):
+        self._get_percentiles()
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        import pandas as pd
+        im_data, profile, _, mask = rut.load_raster(imagedata)
+        percentages = self._get_percentiles()
+        nodata = profile.get("nodata")
+        bands, height, width = im_data.shape
+
+        # a single streaming pass computes mergeable partial statistics per chunk
+        band_stats = [None] * bands
+
+        def chunk_statistics(window):
+            row_start, row_stop, _, _ = window
+            chunk = tiling.read_window(im_data, window)
+            chunk_mask = None if mask is None else mask[row_start:row_stop]
+            return [stut.band_statistics(band, nodata, chunk_mask) for band in chunk]
+
+        def merge_chunk(window, partials):
+            for i, partial in enumerate(partials):
+                band_stats[i] = partial if band_stats[i] is None else stut.merge_statistics(band_stats[i], partial)
+
+        tiling.run_tiles(
+            chunk_statistics,
+            tiling.row_windows(height, width, self.rows_per_chunk),
+            on_result=merge_chunk,
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            message="Computed statistics of chunk",
+        )
+
+        exec_context.set_progress(0.9, "Creating output tables...")
+        stats_rows = []
+        histogram_rows = []
+        for i, stats in enumerate(band_stats):
+            row = {
+                "Band": f"Band_{i+1}",
+                "Count": int(stats["count"]),
+                "Nodata count": int(stats["nodata_count"]),
+                "Min": float(stats["min"]),
+                "Max": float(stats["max"]),
+                "Mean": float(stats["mean"]) if stats["count"] else np.nan,
+                "Std": stut.std(stats),
+            }
+            for p, value in zip(percentages, stut.percentiles(stats, percentages)):
+                row[f"P{p:g}"] = float(value)
+            stats_rows.append(row)
+
+            counts, edges = stut.histogram(stats, self.bins)
+            for j, count in enumerate(counts):
+                histogram_rows.append({
+                    "Band": f"Band_{i+1}",
+                    "Bin": j + 1,
+                    "Lower bound": float(edges[j]),
+                    "Upper bound": float(edges[j + 1]),
+                    "Count": int(count),
+                })
+
+        return (
+            knext.Table.from_pandas(pd.DataFrame(stats_rows)),
+            knext.Table.from_pandas(pd.DataFrame(histogram_rows)),
+        )
+
+
+############################################
+# K-Means Pixel Classification
+############################################
+
+@knext.node(
+    name="K-Means Pixel Classification",
+    node_type=knext.NodeType.LEARNER,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster",
+    description="Raster image whose pixels are clustered using all bands as features.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_binary(
+    name="Class Raster",
+    description="Single band uint8 raster with the cluster number (1 to k) of each pixel and 0 for nodata.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_table(
+    name="Cluster Centers",
+    description="Table with the band values of each cluster center.",
+)
+
+class KMeansClassificationNode:
+    n_clusters = knext.IntParameter(
+        "Number of clusters",
+        "The number of clusters (k) to find.",
+        default_value=5,
+        min_value=2,
+        max_value=254,
+    )
+
+    sample_size = knext.IntParameter(
+        "Sample size",
+        """The number of randomly sampled valid pixels the cluster centers are fitted on. 
+        All pixels are assigned to the closest center afterwards.""",
+        default_value=100000,
+        min_value=100,
+    )
+
+    batch_size = knext.IntParameter(
+        "Mini-batch size",
+        "The number of sampled pixels used per iteration of the mini-batch k-means.",
+        default_value=1024,
+        min_value=10,
+    )
+
+    max_iter = knext.IntParameter(
+        "Maximum iterations",
+        "The maximum number of mini-batch iterations.",
+        default_value=300,
+        min_value=1,
+    )
+
+    seed = knext.IntParameter(
+        "Random seed",
+        "The seed for sampling and initialization which makes the result reproducible.",
+        default_value=42,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to assign the row blocks in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    rows_per_chunk = knext.IntParameter(
+        "Rows per chunk",
+        """The number of rows that are assigned at once. 
+        Smaller values reduce the memory needed for the distance computation.""",
+        default_value=256,
+        min_value=1,
+    )
+
+    def configure(self, configure_context, input_binary_schema):
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        import pandas as pd
+        im_data, profile, bounds, mask = rut.load_raster(imagedata)
+        nodata = profile.get("nodata")
+        bands, height, width = im_data.shape
+
+        exec_context.set_progress(0.15, "Fitting cluster centers on pixel sample...")
+        pixels = clut.sample_pixels(im_data, self.sample_size, nodata, self.seed, mask)
+        try:
+            centers = clut.fit_kmeans(
+                pixels, self.n_clusters, self.batch_size, self.max_iter, seed=self.seed
+            )
+        except ValueError as e:
+            raise knext.InvalidParametersError(str(e))
+        knut.check_canceled(exec_context)
+
+        def assign_chunk(window):
+            row_start, row_stop, _, _ = window
+            chunk_mask = None if mask is None else mask[row_start:row_stop]
+            if chunk_mask is not None and not chunk_mask.any():
+                # chunks without valid pixels are skipped
+                return 0
+            return clut.assign_clusters(tiling.read_window(im_data, window), centers, nodata, chunk_mask)
+
+        result = np.empty((1, height, width), dtype=np.uint8)
+        tiling.run_tiles(
+            assign_chunk,
+            tiling.row_windows(height, width, self.rows_per_chunk),
+            out=result[0],
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            progress_start=0.3,
+            message="Classified chunk",
+        )
+
+        new_profile = profile.copy()
+        new_profile.update({
+            "count": 1,
+            "dtype": "uint8",
+            "nodata": 0,
+        })
+        df_centers = pd.DataFrame(centers, columns=[f"Band_{i+1}" for i in range(bands)])
+        df_centers.insert(0, "Cluster", np.arange(1, len(centers) + 1))
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        return rut.dump_raster(result, new_profile, bounds), knext.Table.from_pandas(df_centers)
+
+
+############################################
+# Change Detection
+############################################
+
+@knext.node(
+    name="Change Detection",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Before Raster",
+    description="Raster image of the earlier scene.",
+    id="rasterio.data.profile",
+)
+@knext.input_binary(
+    name="After Raster",
+    description="""Raster image of the later scene. It needs the same CRS, grid and number of bands as the 
+    before raster. Use the Align Rasters node to bring rasters onto a common grid.""",
+    id="rasterio.data.profile",
+)
+
+@knext.output_binary(
+    name="Change Raster",
+    description="""Raster with the difference or ratio of each band as float32 with NaN as nodata or 
+    the uint8 change mask with 1 for decrease, 2 for no change, 3 for increase and 0 for nodata.""",
+    id="rasterio.data.profile",
+)
+@knext.output_table(
+    name="Change Summary",
+    description="""One row per band and change class with the number of pixels, their area in squared 
+    units of the raster CRS and their share of all pixels.""",
+)
+
+class ChangeDetectionNode:
+    method = knext.StringParameter(
+        "Output",
+        """Select the change raster to compute:
+
+        - **difference**: After - before.
+        - **ratio**: After / before. Pixels where the before value is 0 are nodata.
+        - **change mask**: The change class of each pixel.""",
+        default_value="difference",
+        enum=rut.CHANGE_METHODS,
+    )
+
+    threshold = knext.DoubleParameter(
+        "Threshold",
+        """The minimal change of a pixel to count as decrease or increase. For the difference and the 
+        change mask it applies to after - before and for the ratio to the relative change after / before - 1 
+        e.g. 0.1 for a change of 10%.""",
+        default_value=0.0,
+        min_value=0.0,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to compare the row blocks in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    rows_per_chunk = knext.IntParameter(
+        "Rows per chunk",
+        "The number of rows that are compared at once.",
+        default_value=512,
+        min_value=1,
+    )
+
+    def configure(self, configure_context, before_schema, after_schema):
+        return None
+
+    def execute(self, exec_context, before_data, after_data):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        import pandas as pd
+        before, profile, bounds, before_mask = rut.load_raster(before_data)
+        after, after_profile, _, after_mask = rut.load_raster(after_data)
+        if before.shape != after.shape:
+            raise knext.InvalidParametersError(
+                f"The rasters have different shapes {before.shape} and {after.shape}. "
+                "Use the Align Rasters node to bring them onto a common grid."
+            )
+        if profile["crs"] != after_profile["crs"] or not profile["transform"].almost_equals(after_profile["transform"]):
+            raise knext.InvalidParametersError(
+                "The rasters have a different CRS or grid. Use the Align Rasters node to bring them onto a common grid."
+            )
+        bands, height, width = before.shape
+        is_mask = self.method == "change mask"
+        result = np.empty(before.shape, dtype=np.uint8 if is_mask else np.float32)
+        counts = np.zeros((bands, len(rut.CHANGE_CLASSES)), dtype=np.int64)
+
+        def compare_chunk(window):
+            row_start, row_stop, _, _ = window
+            return rut.detect_change(
+                tiling.read_window(before, window),
+                tiling.read_window(after, window),
+                self.method,
+                self.threshold,
+                profile.get("nodata"),
+                after_profile.get("nodata"),
+                None if before_mask is None else before_mask[row_start:row_stop],
+                None if after_mask is None else after_mask[row_start:row_stop],
+            )
+
+        def collect_chunk(window, chunk_result):
+            # the class counts are summed up in the same pass that writes the change raster
+            values, chunk_counts = chunk_result
+            row_start, row_stop, col_start, col_stop = window
+            result[:, row_start:row_stop, col_start:col_stop] = values
+            counts[:] += chunk_counts
+
+        tiling.run_tiles(
+            compare_chunk,
+            tiling.row_windows(height, width, self.rows_per_chunk),
+            on_result=collect_chunk,
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            message="Compared chunk",
+        )
+
+        exec_context.set_progress(0.9, "Creating change summary...")
+        transform = profile["transform"]
+        pixel_area = abs(transform.a * transform.e - transform.b * transform.d)
+        summary = []
+        for i in range(bands):
+            for j, name in enumerate(rut.CHANGE_CLASSES):
+                summary.append({
+                    "Band": f"Band_{i+1}",
+                    "Class": name,
+                    "Pixel count": int(counts[i, j]),
+                    "Area": float(counts[i, j] * pixel_area),
+                    "Percent": float(100.0 * counts[i, j] / (height * width)),
+                })
+
+        new_profile = profile.copy()
+        new_profile.update({
+            "dtype": result.dtype.name,
+            "nodata": 0 if is_mask else np.nan,
+        })
+        return rut.dump_raster(result, new_profile, bounds), knext.Table.from_pandas(pd.DataFrame(summary))
+
+
+############################################
+# Terrain Analysis
+############################################
+
+@knext.node(
+    name="Terrain Analysis",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input DEM",
+    description="Digital elevation model raster.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_binary(
+    name="Terrain Raster",
+    description="Float32 raster with one band per selected terrain product in the order slope, aspect, hillshade, curvature.",
+    id="rasterio.data.profile",
+)
+
+class TerrainAnalysisNode:
+    band = knext.IntParameter(
+        "Elevation band",
+        "The band that holds the elevation. Band indices start from 1.",
+        default_value=1,
+        min_value=1,
+    )
+
+    slope = knext.BoolParameter(
+        "Slope",
+        "Compute the slope in degrees.",
+        default_value=True,
+    )
+
+    aspect = knext.BoolParameter(
+        "Aspect",
+        "Compute the aspect in degrees clockwise from north. Flat pixels get the value -1.",
+        default_value=False,
+    )
+
+    hillshade = knext.BoolParameter(
+        "Hillshade",
+        "Compute the hillshade between 0 (shadow) and 255 (fully lit).",
+        default_value=False,
+    )
+
+    curvature = knext.BoolParameter(
+        "Curvature",
+        """Compute the curvature in 1/100 elevation units. Positive values indicate upwardly convex 
+        and negative values upwardly concave surfaces.""",
+        default_value=False,
+    )
+
+    z_factor = knext.DoubleParameter(
+        "Z factor",
+        """The factor that converts the elevation values to meters e.g. 0.3048 for elevations in feet. 
+        The pixel size is always converted to meters, also for geographic CRSs.""",
+        default_value=1.0,
+    )
+
+    azimuth = knext.DoubleParameter(
+        "Sun azimuth",
+        "The compass direction of the sun in degrees used for the hillshade.",
+        default_value=315.0,
+        min_value=0.0,
+        max_value=360.0,
+    )
+
+    altitude = knext.DoubleParameter(
+        "Sun altitude",
+        "The angle of the sun above the horizon in degrees used for the hillshade.",
+        default_value=45.0,
+        min_value=0.0,
+        max_value=90.0,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to process the tiles in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    tile_size = knext.IntParameter(
+        "Tile size",
+        """The DEM is processed in square tiles of this many pixels per side which are extended 
+        by one pixel to avoid seams.""",
+        default_value=512,
+        min_value=16,
+    )
+
+    def _get_products(self):
+        selected = [self.slope, self.aspect, self.hillshade, self.curvature]
+        products = [p for p, s in zip(fut.TERRAIN_PRODUCTS, selected) if s]
+        if not products:
+            raise knext.InvalidParametersError("Select at least one terrain product")
+        return products
+
+    def configure(self, configure_context, input_binary_schema):
+        self._get_products()
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        im_data, profile, bounds, mask = rut.load_raster(imagedata)
+        if self.band > im_data.shape[0]:
+            raise knext.InvalidParametersError(
+                f"Band {self.band} does not exist. The raster has {im_data.shape[0]} band(s)."
+            )
+
+        products = self._get_products()
+        dem = im_data[self.band - 1]
+        height, width = dem.shape
+        nodata = profile.get("nodata")
+        x_size, y_size = rut.pixel_size_meters(profile["transform"], profile.get("crs"), np.arange(height))
+        result = np.empty((len(products), height, width), dtype=np.float32)
+
+        def terrain_tile(window):
+            row_start, row_stop, _, _ = window
+            tile_mask = None if mask is None else tiling.read_window(mask, window, 1, 1)
+            if tile_mask is not None and not tile_mask.any():
+                # tiles without valid pixels are skipped
+                return np.nan
+            tile = tiling.read_window(dem, window, 1, 1)
+            invalid = rut.invalid_mask(tile, nodata, tile_mask)
+            tile = tile.astype(np.float64)
+            tile[invalid] = np.nan
+            return fut.terrain(
+                tile,
+                x_size[row_start:row_stop],
+                y_size[row_start:row_stop],
+                products,
+                self.z_factor,
+                self.azimuth,
+                self.altitude,
+            )
+
+        tiling.run_tiles(
+            terrain_tile,
+            tiling.tile_windows(height, width, self.tile_size),
+            out=result,
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            message="Processed tile",
+        )
+
+        new_profile = profile.copy()
+        new_profile.update({
+            "count": len(products),
+            "dtype": "float32",
+            "nodata": np.nan,
+        })
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        return rut.dump_raster(result, new_profile, bounds)
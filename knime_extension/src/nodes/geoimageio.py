@@ -1,5 +1,6 @@
 import knime_extension as knext
 import util.knime_utils as knut
+import util.raster_utils as rut
 
 __category = knext.category(
     path="/community/geoimage",
@@ -65,6 +66,22 @@ class GeoTiffReaderNode:
         im_data = dataset.read()
         profile = dataset.profile
         bounds = [*dataset.bounds]  
+
+        # Internal masks and alpha bands are kept as validity mask, nodata values are part of the profile
+        from rasterio.enums import MaskFlags
+        mask = None
+        if any(MaskFlags.per_dataset in flags or MaskFlags.alpha in flags for flags in dataset.mask_flag_enums):
+            mask = dataset.dataset_mask() > 0
+
+        # Band statistics stored in the file are passed on so views do not need to scan the pixels
+        stats = {}
+        for i in range(dataset.count):
+            tags = dataset.tags(i + 1)
+            if "STATISTICS_MINIMUM" in tags and "STATISTICS_MAXIMUM" in tags:
+                stats[i] = {
+                    "min": float(tags["STATISTICS_MINIMUM"]),
+                    "max": float(tags["STATISTICS_MAXIMUM"]),
+                }
         bounds_str = str(bounds)  
 
         # Profile to table
@@ -79,8 +96,7 @@ class GeoTiffReaderNode:
         df_profile = pd.concat([df_profile, additional_rows], ignore_index=True)
         exec_context.set_progress(0.8, "Profile and metadata extracted...")
         
-        import pickle
-        imagedata = pickle.dumps([im_data, profile,bounds])
+        imagedata = rut.dump_raster(im_data, profile, bounds, mask, {"stats": stats} if stats else None)
 
         return imagedata, knext.Table.from_pandas(df_profile)
 
@@ -116,14 +132,17 @@ class GeoTiffWriterNode:
         exec_context.set_progress(0.1, "Preparing to write GeoTIFF file...")
 
         # Deserialize the input binary data to retrieve image data and profile
-        import pickle
-        im_data, profile,_ = pickle.loads(imagedata) # Unpack the image data and profile
+        im_data, profile, _, mask = rut.load_raster(imagedata) # Unpack the image data and profile
 
         exec_context.set_progress(0.5, "Writing the GeoTIFF file...")
         
         import rasterio
         # Write the image data to the specified GeoTIFF file
-        with rasterio.open(self.output_tif_path, 'w', **profile) as dataset:
-            dataset.write(im_data)
+        # The validity mask is written as internal GeoTIFF mask instead of a sidecar file
+        with rasterio.Env(GDAL_TIFF_INTERNAL_MASK=True):
+            with rasterio.open(self.output_tif_path, 'w', **profile) as dataset:
+                dataset.write(im_data)
+                if mask is not None:
+                    dataset.write_mask(mask)
 
         exec_context.set_progress(1.0, "GeoTIFF file written successfully.")
@@ -1,5 +1,8 @@
 import knime_extension as knext
 import util.knime_utils as knut
+import util.raster_utils as rut
+import util.focal_utils as fut
+import util.tiling as tiling
 
 __category = knext.category(
     path="/community/geoimage",
@@ -43,18 +46,37 @@ class ImageToTableNode:
         exec_context.set_progress(0.1, "Starting image reshaping...")
 
         # Deserialize the input binary data to retrieve image data and profile
-        import pickle
-        im_data, _, _= pickle.loads(imagedata) # Unpack the image data and profile
-
-        # Reshape image from (Bands, Height, Width) to (Height * Width, Bands)
-        img_reshaped = im_data.transpose(1, 2, 0).reshape(-1, im_data.shape[0])
+        im_data, profile, _, mask = rut.load_raster(imagedata) # Unpack the image data and profile
+        nodata = profile.get("nodata")
 
         import pandas as pd
         import numpy as np
-        # Convert reshaped image data to a pandas DataFrame with band values as columns
+        # Convert the bands to float32 in parallel row bands. The (Bands, Height * Width) layout matches the
+        # column blocks of pandas, so the transposed view becomes the DataFrame without another copy.
+        bands, height, width = im_data.shape
+        img_float = np.empty((bands, height, width), dtype=np.float32)
+
+        def convert_rows(window):
+            # invalid pixels become missing values instead of exporting the nodata value as data
+            row_start, row_stop, _, _ = window
+            source = tiling.read_window(im_data, window)
+            chunk = source.astype(np.float32)
+            chunk[rut.invalid_mask(source, nodata, None if mask is None else mask[row_start:row_stop])] = np.nan
+            return chunk
+
+        tiling.run_tiles(
+            convert_rows,
+            tiling.row_windows(height, width, 512),
+            out=img_float,
+            exec_context=exec_context,
+            progress_start=0.1,
+            progress_end=0.6,
+            message="Converted rows",
+        )
         img_df = pd.DataFrame(
-            img_reshaped.astype(np.float32), 
-            columns=[f"Band_{i+1}" for i in range(im_data.shape[0])]
+            img_float.reshape(bands, -1).T,
+            columns=[f"Band_{i+1}" for i in range(bands)],
+            copy=False,
         )
 
         # Generate row and column indices for the image and add them to the DataFrame
@@ -110,8 +132,7 @@ class ExtractValuesToPoints:
         exec_context.set_progress(0.1, "Starting image reshaping...")
 
         # Deserialize the input binary data to retrieve image data and profile
-        import pickle
-        img, profile, _ = pickle.loads(imagedata) # Unpack the image data and profile
+        img, profile, _, mask = rut.load_raster(imagedata) # Unpack the image data and profile
        
         
         import geopandas as gp
@@ -125,12 +146,19 @@ class ExtractValuesToPoints:
         sample_coords = [rowcol(profile['transform'], x, y) for x, y in points]
         
         num_bands = img.shape[0]  
-        sample_values = np.array([img[:, row, col] for row, col in sample_coords])
+        sample_values = np.array([img[:, row, col] for row, col in sample_coords]).reshape(-1, num_bands)
+
+        # nodata values and masked pixels are returned as missing values
+        invalid = rut.invalid_mask(sample_values, profile.get("nodata"))
+        if mask is not None:
+            invalid |= np.array([not mask[row, col] for row, col in sample_coords], dtype=bool)[:, np.newaxis]
+        sample_values = sample_values.astype(np.float32)
+        sample_values[invalid] = np.nan
 
         exec_context.set_progress(0.9, "Data extracted successfully.")
 
         band_columns = [f"Band_{i+1}" for i in range(num_bands)]  
-        data = pd.DataFrame(sample_values.astype(np.float32), columns=band_columns)
+        data = pd.DataFrame(sample_values, columns=band_columns)
         
         original_gdf = gdf.reset_index(drop=True)
         data = pd.concat([original_gdf, data], axis=1)
@@ -180,8 +208,7 @@ class TableToGeoImageNode:
     def execute(self, exec_context, imagedata,input_table):
 
         exec_context.set_progress(0.1, "Profile and metadata extracted...")
-        import pickle
-        img, profile, bounds = pickle.loads(imagedata) # Unpack the image data and profile
+        img, profile, bounds, _ = rut.load_raster(imagedata) # Unpack the image data and profile
         img_df = input_table.to_pandas()
  
         bands = []
@@ -202,8 +229,7 @@ class TableToGeoImageNode:
       
         exec_context.set_progress(0.8, "Profile and metadata extracted...")
         
-        import pickle
-        imagedata = pickle.dumps([new_raster, profile,bounds])
+        imagedata = rut.dump_raster(new_raster, profile, bounds)
 
         return imagedata
 
@@ -251,6 +277,14 @@ class RasterClipNode:
         default_value=True   
     )  
 
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to rasterize the clip geometry tile by tile. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
     def configure(self, configure_context, input_binary_schema,input_schema):
         self.geo_col = knut.column_exists_or_preset(configure_context, self.geo_col, input_schema, knut.is_geo)
         return None
@@ -259,46 +293,1477 @@ class RasterClipNode:
 
         exec_context.set_progress(0.1, "Profile and metadata extracted...")
 
-        import pickle
-        im_data, profile, bounds = pickle.loads(imagedata)
+        im_data, profile, bounds, mask = rut.load_raster(imagedata)
 
         import geopandas as gp
         gdf = gp.GeoDataFrame(input_table.to_pandas(), geometry=self.geo_col)
         gdf = gdf.to_crs(profile['crs'])
 
 
-        from rasterio.io import MemoryFile
-        from rasterio.mask import mask
-        with MemoryFile() as memfile:
-            with memfile.open(**profile) as dataset:
+        knut.check_canceled(exec_context)
+        exec_context.set_progress(0.4, "Clipping raster...")
+        clipped_tiff, tiff_transform, clipped_mask = rut.clip_array(
+            im_data,
+            profile["transform"],
+            gdf.geometry,
+            crop=self.crop,
+            nodata=profile.get("nodata"),
+            num_threads=self.num_threads,
+            mask=mask,
+        )
+
+        clipped_profile = profile.copy()
+        clipped_profile.update({
+            "height": clipped_tiff.shape[1],
+            "width": clipped_tiff.shape[2],
+            "transform": tiff_transform
+        })
 
-                dataset.write(im_data)
+        if self.crop:
+            new_bounds = rut.bounds_from_transform(
+                tiff_transform, clipped_tiff.shape[2], clipped_tiff.shape[1]
+            )
+        else:
+            new_bounds = bounds
 
+        exec_context.set_progress(0.9, "Serializing output data...")
 
-                clipped_tiff, tiff_transform = mask(dataset, gdf.geometry, crop=self.crop)
 
+        output_data = rut.dump_raster(clipped_tiff, clipped_profile, new_bounds, clipped_mask)
 
-                clipped_profile = dataset.profile.copy()
-                clipped_profile.update({
-                    "height": clipped_tiff.shape[1],
-                    "width": clipped_tiff.shape[2],
-                    "transform": tiff_transform
-                })
+        return output_data
+
+
+############################################
+# Batch Clip Raster by Polygons
+############################################
+
+@knext.node(
+    name="Batch Clip Raster by Polygons",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "RasterClip.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster Reference",
+    description="Raster image to be clipped by each geometry of the input table.",
+    id="rasterio.data.profile",
+)
+@knext.input_table(
+    name="Polygon Table",
+    description="Table containing one polygon geometry and ID per clip feature.",
+)
+
+@knext.output_table(
+    name="Clipped Raster Table",
+    description="""Table with the feature ID and one serialized raster image per feature. 
+    Features that do not overlap the raster are skipped.""",
+)
+
+class BatchRasterClipNode:
+    geo_col = knext.ColumnParameter(
+        "Geometry Column", 
+        "Select the geometry column",
+        port_index=1, 
+        column_filter=knut.is_geo
+    )
+
+    id_col = knext.ColumnParameter(
+        "ID Column",
+        "Select the column that identifies each feature e.g. the parcel or field ID.",
+        port_index=1,
+        column_filter=knut.is_int_or_string,
+    )
+
+    crop = knext.BoolParameter(
+        "Crop Raster",
+        """If checked, each raster will be cropped to the geometry's extent. 
+        If unchecked, only pixels outside the geometry will be masked, 
+        but the raster shape will remain unchanged.""",
+        default_value=True   
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to clip the features in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    def configure(self, configure_context, input_binary_schema, input_schema):
+        self.geo_col = knut.column_exists_or_preset(configure_context, self.geo_col, input_schema, knut.is_geo)
+        self.id_col = knut.column_exists_or_preset(configure_context, self.id_col, input_schema, knut.is_int_or_string)
+        return None
+
+    def execute(self, exec_context, imagedata, input_table):
+
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        # Deserialize the source raster once for all features
+        im_data, profile, bounds, mask = rut.load_raster(imagedata)
+
+        import geopandas as gp
+        import pandas as pd
+        gdf = gp.GeoDataFrame(input_table.to_pandas(), geometry=self.geo_col)
+        gdf = gdf.to_crs(profile['crs'])
+
+        def clip_feature(geometry):
+            try:
+                clipped, transform, clipped_mask = rut.clip_array(
+                    im_data,
+                    profile["transform"],
+                    [geometry],
+                    crop=self.crop,
+                    nodata=profile.get("nodata"),
+                    mask=mask,
+                )
+            except ValueError:
+                # geometry does not overlap the raster
+                return None
+            clipped_profile = profile.copy()
+            clipped_profile.update({
+                "height": clipped.shape[1],
+                "width": clipped.shape[2],
+                "transform": transform
+            })
+            if self.crop:
+                clipped_bounds = rut.bounds_from_transform(
+                    transform, clipped.shape[2], clipped.shape[1]
+                )
+            else:
+                clipped_bounds = bounds
+            return rut.dump_raster(clipped, clipped_profile, clipped_bounds, clipped_mask)
 
+        results = tiling.run_tiles(
+            clip_feature,
+            gdf.geometry.tolist(),
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            message="Clipped feature",
+        )
+
+        df = pd.DataFrame({self.id_col: gdf[self.id_col].tolist(), "Raster": results})
+        skipped = df["Raster"].isna().sum()
+        if skipped > 0:
+            exec_context.set_warning(f"{skipped} feature(s) do not overlap the raster and were skipped")
+        df = df[df["Raster"].notna()].reset_index(drop=True)
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        return knext.Table.from_pandas(df)
+
+
+############################################
+# Reproject Raster
+############################################
+
+@knext.node(
+    name="Reproject Raster",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster",
+    description="Raster image to reproject.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_binary(
+    name="Reprojected Raster",
+    description="Raster image warped to the target coordinate reference system.",
+    id="rasterio.data.profile",
+)
+
+class ReprojectRasterNode:
+    target_crs = knext.StringParameter(
+        "Target CRS",
+        """Enter the [Coordinate reference system (CRS)](https://en.wikipedia.org/wiki/Spatial_reference_system) 
+        to reproject the raster to e.g. an authority string such as 'EPSG:4326' or a WKT string.""",
+        default_value="EPSG:4326",
+    )
+
+    resolution = knext.DoubleParameter(
+        "Resolution",
+        """The pixel size of the output raster in units of the target CRS. 
+        Use 0 to derive the resolution from the input raster.""",
+        default_value=0.0,
+        min_value=0.0,
+    )
+
+    resampling = knext.StringParameter(
+        "Resampling method",
+        """Select the [resampling method](https://rasterio.readthedocs.io/en/stable/api/rasterio.enums.html#rasterio.enums.Resampling) 
+        used to compute the output pixel values.""",
+        default_value="nearest",
+        enum=rut.RESAMPLING_METHODS,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used for warping. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    block_size = knext.IntParameter(
+        "Block size",
+        """The output raster is warped in independent square blocks of this many pixels per side, 
+        which bounds the memory needed per block and allows to process the blocks in parallel. 
+        Use 0 to warp the whole raster at once.""",
+        default_value=1024,
+        min_value=0,
+    )
 
-                if self.crop:
-                    def calculate_bounds(transform, width, height):
-                        left, top = transform * (0, 0)  
-                        right, bottom = transform * (width, height) 
-                        return [left, bottom, right, top]
+    def configure(self, configure_context, input_binary_schema):
+        if not self.target_crs:
+            raise knext.InvalidParametersError("Please enter a target CRS")
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        im_data, profile, _, mask = rut.load_raster(imagedata)
+        # GDAL only knows about nodata values so masked pixels are written as nodata before warping
+        im_data, nodata = rut.mask_to_nodata(im_data, profile.get("nodata"), mask)
+
+        from rasterio.crs import CRS
+        dst_crs = CRS.from_user_input(self.target_crs)
+
+        reprojected, transform = rut.reproject_array(
+            im_data,
+            profile["transform"],
+            profile["crs"],
+            dst_crs,
+            resolution=self.resolution,
+            resampling=self.resampling,
+            nodata=nodata,
+            num_threads=self.num_threads,
+            block_size=self.block_size,
+            exec_context=exec_context,
+        )
 
-                    new_bounds = calculate_bounds(tiff_transform, clipped_tiff.shape[2], clipped_tiff.shape[1])
-                else:
-                    new_bounds = bounds  
+        new_mask = None
+        if nodata is None:
+            # without nodata value the pixels outside of the source raster are marked by the mask
+            new_mask = rut.coverage_mask(
+                im_data.shape[1],
+                im_data.shape[2],
+                profile["transform"],
+                profile["crs"],
+                transform,
+                dst_crs,
+                reprojected.shape[1],
+                reprojected.shape[2],
+                num_threads=self.num_threads,
+                block_size=self.block_size,
+            )
+
+        new_profile = profile.copy()
+        new_profile.update({
+            "crs": dst_crs,
+            "height": reprojected.shape[1],
+            "width": reprojected.shape[2],
+            "transform": transform,
+            "nodata": nodata,
+        })
+        new_bounds = rut.bounds_from_transform(transform, reprojected.shape[2], reprojected.shape[1])
 
         exec_context.set_progress(0.9, "Serializing output data...")
+        return rut.dump_raster(reprojected, new_profile, new_bounds, new_mask)
 
 
-        output_data = pickle.dumps([clipped_tiff, clipped_profile, new_bounds])
+############################################
+# Resample Raster
+############################################
 
-        return output_data
+@knext.node(
+    name="Resample Raster",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster",
+    description="Raster image to resample.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_binary(
+    name="Resampled Raster",
+    description="Raster image aggregated to the coarser grid.",
+    id="rasterio.data.profile",
+)
+
+class ResampleRasterNode:
+    factor = knext.DoubleParameter(
+        "Resampling factor",
+        """The ratio between the output and the input pixel size e.g. 10 to aggregate a 10 m raster to 100 m. 
+        Integer factors are aggregated block by block, other factors are resampled with GDAL.""",
+        default_value=10.0,
+        min_value=1.0,
+    )
+
+    method = knext.StringParameter(
+        "Aggregation method",
+        "Select how the input pixels that fall into one output pixel are aggregated. Nodata pixels are ignored.",
+        default_value="mean",
+        enum=list(rut.AGGREGATION_METHODS.keys()),
+    )
+
+    rows_per_chunk = knext.IntParameter(
+        "Rows per chunk",
+        """The number of input rows that are aggregated at once. 
+        Smaller values reduce the memory usage for large rasters.""",
+        default_value=1024,
+        min_value=1,
+    )
+
+    def configure(self, configure_context, input_binary_schema):
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        from affine import Affine
+        im_data, profile, _, mask = rut.load_raster(imagedata)
+        # masked pixels are written as nodata so they are ignored by the aggregation
+        im_data, nodata = rut.mask_to_nodata(im_data, profile.get("nodata"), mask)
+
+        bands, height, width = im_data.shape
+        # the aggregated values of mean and sum are no longer integers
+        if self.method in ("mean", "sum") and not np.issubdtype(im_data.dtype, np.floating):
+            dtype = np.dtype("float32")
+        else:
+            dtype = im_data.dtype
+        fill_value = nodata if nodata is not None else (np.nan if np.issubdtype(dtype, np.floating) else 0)
+
+        if float(self.factor).is_integer():
+            factor = int(self.factor)
+            # stream over row bands that are aligned with the aggregation blocks
+            rows_per_chunk = max(self.rows_per_chunk // factor, 1) * factor
+            resampled = np.empty((bands, -(-height // factor), -(-width // factor)), dtype=dtype)
+            for row in range(0, height, rows_per_chunk):
+                knut.check_canceled(exec_context)
+                exec_context.set_progress(
+                    0.1 + 0.8 * row / height, f"Aggregating rows {row} to {min(row + rows_per_chunk, height)}"
+                )
+                result = rut.aggregate_blocks(im_data[:, row:row + rows_per_chunk], factor, self.method, nodata)
+                result[np.isnan(result)] = fill_value
+                resampled[:, row // factor:row // factor + result.shape[1]] = result
+        else:
+            exec_context.set_progress(0.3, "Resampling raster...")
+            from rasterio.enums import Resampling
+            from rasterio.warp import reproject
+            resampled = np.full(
+                (bands, int(np.ceil(height / self.factor)), int(np.ceil(width / self.factor))),
+                fill_value,
+                dtype=dtype,
+            )
+            reproject(
+                source=im_data,
+                destination=resampled,
+                src_transform=profile["transform"],
+                src_crs=profile["crs"],
+                src_nodata=nodata,
+                dst_transform=profile["transform"] * Affine.scale(self.factor),
+                dst_crs=profile["crs"],
+                dst_nodata=nodata,
+                resampling=Resampling[rut.AGGREGATION_METHODS[self.method]],
+                num_threads=rut.get_worker_count(),
+            )
+
+        transform = profile["transform"] * Affine.scale(self.factor)
+        new_profile = profile.copy()
+        new_profile.update({
+            "dtype": resampled.dtype.name,
+            "height": resampled.shape[1],
+            "width": resampled.shape[2],
+            "transform": transform,
+            "nodata": nodata,
+        })
+        new_bounds = rut.bounds_from_transform(transform, resampled.shape[2], resampled.shape[1])
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        return rut.dump_raster(resampled, new_profile, new_bounds)
+
+
+############################################
+# Raster Calculator
+############################################
+
+@knext.node(
+    name="Raster Calculator",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster",
+    description="Raster image whose bands are used in the expression.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_binary(
+    name="Result Raster",
+    description="Single band float32 raster with the result of the expression. Invalid pixels are NaN.",
+    id="rasterio.data.profile",
+)
+
+class RasterCalculatorNode:
+    expression = knext.StringParameter(
+        "Expression",
+        """The band math expression to evaluate for every pixel. Use B1, B2, ... to refer to the bands 
+        e.g. "(B4 - B3) / (B4 + B3)" for the NDVI of a Landsat 7 image. Supported are the operators 
+        +, -, *, /, **, %, comparisons and the functions 
+        sqrt, log, log10, exp, abs, sin, cos, tan, arctan2 and where(condition, x, y). 
+        & and | combine comparisons e.g. "(B1 > 0) & (B2 < 5)" and ~ negates them. On integer rasters 
+        & and | also test bit flags e.g. of quality bands with "(B7 & 8) > 0". 
+        Pixels where any referenced band is nodata are set to NaN. The expression is evaluated with 
+        [numexpr](https://github.com/pydata/numexpr) if it is installed and with NumPy otherwise.""",
+        default_value="B1",
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to evaluate the chunks in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    rows_per_chunk = knext.IntParameter(
+        "Rows per chunk",
+        """The number of rows that are evaluated at once. 
+        Smaller values reduce the memory needed for intermediate results.""",
+        default_value=512,
+        min_value=1,
+    )
+
+    def configure(self, configure_context, input_binary_schema):
+        try:
+            rut.parse_band_expression(self.expression, None)
+        except ValueError as e:
+            raise knext.InvalidParametersError(str(e))
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        im_data, profile, bounds, mask = rut.load_raster(imagedata)
+
+        try:
+            rut.parse_band_expression(self.expression, im_data.shape[0], im_data.dtype)
+        except ValueError as e:
+            raise knext.InvalidParametersError(str(e))
+
+        height = im_data.shape[1]
+        result = np.empty((1, height, im_data.shape[2]), dtype=np.float32)
+        nodata = profile.get("nodata")
+
+        def evaluate_chunk(window):
+            row_start, row_stop, col_start, col_stop = window
+            chunk_mask = None if mask is None else mask[row_start:row_stop, col_start:col_stop]
+            if chunk_mask is not None and not chunk_mask.any():
+                # chunks without valid pixels are skipped
+                return np.nan
+            return rut.evaluate_band_expression(
+                self.expression, tiling.read_window(im_data, window), nodata, chunk_mask
+            )
+
+        tiling.run_tiles(
+            evaluate_chunk,
+            tiling.row_windows(height, im_data.shape[2], self.rows_per_chunk),
+            out=result[0],
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            message="Evaluated chunk",
+        )
+
+        new_profile = profile.copy()
+        new_profile.update({
+            "count": 1,
+            "dtype": "float32",
+            "nodata": np.nan,
+        })
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        return rut.dump_raster(result, new_profile, bounds)
+
+
+############################################
+# Spectral Indices
+############################################
+
+@knext.node(
+    name="Spectral Indices",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster",
+    description="Multispectral raster image.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_binary(
+    name="Index Raster",
+    description="""Float32 raster with one band per selected index in the order 
+    NDVI, NDWI, EVI, SAVI, NDBI, NBR. Invalid pixels are NaN.""",
+    id="rasterio.data.profile",
+)
+
+class SpectralIndicesNode:
+    blue_band = knext.IntParameter(
+        "Blue band",
+        "The band number of the blue band (band indices start from 1). Use 0 if the band is not available.",
+        default_value=1,
+        min_value=0,
+    )
+
+    green_band = knext.IntParameter(
+        "Green band",
+        "The band number of the green band (band indices start from 1). Use 0 if the band is not available.",
+        default_value=2,
+        min_value=0,
+    )
+
+    red_band = knext.IntParameter(
+        "Red band",
+        "The band number of the red band (band indices start from 1). Use 0 if the band is not available.",
+        default_value=3,
+        min_value=0,
+    )
+
+    nir_band = knext.IntParameter(
+        "NIR band",
+        "The band number of the near infrared band (band indices start from 1). Use 0 if the band is not available.",
+        default_value=4,
+        min_value=0,
+    )
+
+    swir1_band = knext.IntParameter(
+        "SWIR 1 band",
+        """The band number of the shortwave infrared band around 1.6 µm (band indices start from 1). 
+        Use 0 if the band is not available.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    swir2_band = knext.IntParameter(
+        "SWIR 2 band",
+        """The band number of the shortwave infrared band around 2.2 µm (band indices start from 1). 
+        Use 0 if the band is not available.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    ndvi = knext.BoolParameter(
+        "NDVI",
+        "Normalized Difference Vegetation Index: (NIR - Red) / (NIR + Red)",
+        default_value=True,
+    )
+
+    ndwi = knext.BoolParameter(
+        "NDWI",
+        "Normalized Difference Water Index: (Green - NIR) / (Green + NIR)",
+        default_value=False,
+    )
+
+    evi = knext.BoolParameter(
+        "EVI",
+        "Enhanced Vegetation Index: 2.5 * (NIR - Red) / (NIR + 6 * Red - 7.5 * Blue + 1)",
+        default_value=False,
+    )
+
+    savi = knext.BoolParameter(
+        "SAVI",
+        "Soil Adjusted Vegetation Index: (1 + L) * (NIR - Red) / (NIR + Red + L)",
+        default_value=False,
+    )
+
+    ndbi = knext.BoolParameter(
+        "NDBI",
+        "Normalized Difference Built-up Index: (SWIR 1 - NIR) / (SWIR 1 + NIR)",
+        default_value=False,
+    )
+
+    nbr = knext.BoolParameter(
+        "NBR",
+        "Normalized Burn Ratio: (NIR - SWIR 2) / (NIR + SWIR 2)",
+        default_value=False,
+    )
+
+    savi_l = knext.DoubleParameter(
+        "SAVI soil brightness factor (L)",
+        "The soil brightness correction factor L of the SAVI.",
+        default_value=0.5,
+        min_value=0.0,
+        max_value=1.0,
+    )
+
+    scale = knext.DoubleParameter(
+        "Reflectance scale",
+        """The pixel values are divided by this value to obtain reflectances between 0 and 1 
+        e.g. 10000 for Sentinel-2 L2A products. This matters for EVI and SAVI which use additive constants.""",
+        default_value=1.0,
+        min_value=0.0,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to compute the chunks in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    rows_per_chunk = knext.IntParameter(
+        "Rows per chunk",
+        """The number of rows that are computed at once. 
+        Smaller values reduce the memory needed for intermediate results.""",
+        default_value=512,
+        min_value=1,
+    )
+
+    def _get_band_map(self):
+        return {
+            "blue": self.blue_band,
+            "green": self.green_band,
+            "red": self.red_band,
+            "nir": self.nir_band,
+            "swir1": self.swir1_band,
+            "swir2": self.swir2_band,
+        }
+
+    def _get_indices(self):
+        selection = {
+            "NDVI": self.ndvi,
+            "NDWI": self.ndwi,
+            "EVI": self.evi,
+            "SAVI": self.savi,
+            "NDBI": self.ndbi,
+            "NBR": self.nbr,
+        }
+        return [index for index in rut.SPECTRAL_INDICES if selection[index]]
+
+    def _check_settings(self, band_count=None):
+        indices = self._get_indices()
+        if not indices:
+            raise knext.InvalidParametersError("Please select at least one index")
+        if self.scale <= 0:
+            raise knext.InvalidParametersError("The reflectance scale must be larger than 0")
+        band_map = self._get_band_map()
+        for index in indices:
+            for band in rut.SPECTRAL_INDICES[index]:
+                if band_map[band] < 1:
+                    raise knext.InvalidParametersError(
+                        f"{index} requires the {band.upper()} band. Please select its band number."
+                    )
+                if band_count is not None and band_map[band] > band_count:
+                    raise knext.InvalidParametersError(
+                        f"Band {band_map[band]} does not exist. The raster has {band_count} band(s)."
+                    )
+        return indices, band_map
+
+    def configure(self, configure_context, input_binary_schema):
+        self._check_settings()
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        im_data, profile, bounds, mask = rut.load_raster(imagedata)
+        indices, band_map = self._check_settings(im_data.shape[0])
+
+        height = im_data.shape[1]
+        result = np.empty((len(indices), height, im_data.shape[2]), dtype=np.float32)
+        nodata = profile.get("nodata")
+
+        def compute_chunk(window):
+            row_start, row_stop, _, _ = window
+            chunk_mask = None if mask is None else mask[row_start:row_stop]
+            if chunk_mask is not None and not chunk_mask.any():
+                # chunks without valid pixels are skipped
+                tiling.read_window(result, window)[...] = np.nan
+                return
+            # the indices are written directly into the matching rows of the preallocated result
+            rut.compute_spectral_indices(
+                tiling.read_window(im_data, window),
+                band_map,
+                indices,
+                tiling.read_window(result, window),
+                nodata=nodata,
+                scale=self.scale,
+                savi_l=self.savi_l,
+                mask=chunk_mask,
+            )
+
+        tiling.run_tiles(
+            compute_chunk,
+            tiling.row_windows(height, im_data.shape[2], self.rows_per_chunk),
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            message="Computed chunk",
+        )
+
+        new_profile = profile.copy()
+        new_profile.update({
+            "count": len(indices),
+            "dtype": "float32",
+            "nodata": np.nan,
+        })
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        return rut.dump_raster(result, new_profile, bounds)
+
+
+############################################
+# Focal Filter
+############################################
+
+@knext.node(
+    name="Focal Filter",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster",
+    description="Raster image to filter.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_binary(
+    name="Filtered Raster",
+    description="Float32 raster with the filtered bands. Invalid pixels are NaN.",
+    id="rasterio.data.profile",
+)
+
+class FocalFilterNode:
+    filter_type = knext.StringParameter(
+        "Filter",
+        """Select the focal filter to apply to each band:
+
+        - **mean**: Average of the window. Large windows are computed with a summed-area table.
+        - **gaussian**: Gaussian smoothing with the given standard deviation computed as separable 1-D passes.
+        - **median**: Median of the window.
+        - **min**: Minimum of the window.
+        - **max**: Maximum of the window.
+        - **sobel**: Gradient magnitude of the Sobel edge detector.
+        - **custom**: Correlation with the custom kernel. Large kernels are computed via FFT.
+
+        Nodata pixels are ignored by mean, gaussian, median, min and max. Sobel and custom kernels return NaN 
+        wherever a nodata pixel falls into the kernel.""",
+        default_value="mean",
+        enum=fut.FOCAL_FILTERS,
+    )
+
+    size = knext.IntParameter(
+        "Window size",
+        "The odd width and height in pixels of the window used by the mean, median, min and max filters.",
+        default_value=3,
+        min_value=1,
+    )
+
+    sigma = knext.DoubleParameter(
+        "Sigma",
+        "The standard deviation in pixels of the gaussian filter.",
+        default_value=1.0,
+        min_value=0.1,
+    )
+
+    kernel = knext.StringParameter(
+        "Custom kernel",
+        """The weights of the custom kernel with values separated by commas and rows separated by semicolons 
+        e.g. "0,-1,0;-1,5,-1;0,-1,0" for sharpening. The kernel needs an odd number of rows and columns 
+        and is applied as written without flipping.""",
+        default_value="1,1,1;1,1,1;1,1,1",
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to filter the tiles in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    tile_size = knext.IntParameter(
+        "Tile size",
+        """The raster is filtered in square tiles of this many pixels per side which are extended 
+        by the kernel radius to avoid seams.""",
+        default_value=512,
+        min_value=16,
+    )
+
+    def _get_kernel(self):
+        if self.filter_type != "custom":
+            return None
+        try:
+            return fut.parse_kernel(self.kernel)
+        except ValueError as e:
+            raise knext.InvalidParametersError(str(e))
+
+    def configure(self, configure_context, input_binary_schema):
+        if self.size % 2 == 0:
+            raise knext.InvalidParametersError("The window size must be odd")
+        self._get_kernel()
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        im_data, profile, bounds, mask = rut.load_raster(imagedata)
+
+        kernel = self._get_kernel()
+        row_halo, col_halo = fut.kernel_radius(self.filter_type, self.size, self.sigma, kernel)
+        _, height, width = im_data.shape
+        nodata = profile.get("nodata")
+        result = np.empty(im_data.shape, dtype=np.float32)
+
+        def filter_tile(window):
+            tile_mask = None if mask is None else tiling.read_window(mask, window, row_halo, col_halo)
+            if tile_mask is not None and not tile_mask.any():
+                # tiles without valid pixels are skipped
+                return np.nan
+            tile = tiling.read_window(im_data, window, row_halo, col_halo)
+            invalid = rut.invalid_mask(tile, nodata, tile_mask)
+            tile = tile.astype(np.float64)
+            tile[invalid] = np.nan
+            return np.stack([
+                fut.focal_filter(band, self.filter_type, self.size, self.sigma, kernel)
+                for band in tile
+            ])
+
+        tiling.run_tiles(
+            filter_tile,
+            tiling.tile_windows(height, width, self.tile_size),
+            out=result,
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            message="Filtered tile",
+        )
+
+        new_profile = profile.copy()
+        new_profile.update({
+            "dtype": "float32",
+            "nodata": np.nan,
+        })
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        return rut.dump_raster(result, new_profile, bounds)
+
+
+############################################
+# Polygonize Raster
+############################################
+
+@knext.node(
+    name="Polygonize Raster",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "GeoImagetoTable.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster",
+    description="Classified raster image to convert into polygons.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_table(
+    name="Polygon Table",
+    description="Table with one polygon per connected region of equal value in the CRS of the raster.",
+)
+
+class PolygonizeRasterNode:
+    band = knext.IntParameter(
+        "Band",
+        "The band to polygonize. Band indices start from 1.",
+        default_value=1,
+        min_value=1,
+    )
+
+    connectivity = knext.StringParameter(
+        "Pixel connectivity",
+        """Select if pixels are connected via their 4 edge neighbours or 
+        also via their 4 diagonal neighbours.""",
+        default_value="4",
+        enum=["4", "8"],
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to polygonize the tiles in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    tile_size = knext.IntParameter(
+        "Tile size",
+        """The raster is polygonized in square tiles of this many pixels per side. 
+        Polygons that are split at tile borders are merged afterwards.""",
+        default_value=1024,
+        min_value=16,
+    )
+
+    def configure(self, configure_context, input_binary_schema):
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import geopandas as gp
+        im_data, profile, _, mask = rut.load_raster(imagedata)
+        if self.band > im_data.shape[0]:
+            raise knext.InvalidParametersError(
+                f"Band {self.band} does not exist. The raster has {im_data.shape[0]} band(s)."
+            )
+
+        band = im_data[self.band - 1]
+        height, width = band.shape
+        nodata = profile.get("nodata")
+        final = []
+        seam = []
+
+        def collect_tile(window, polygons):
+            final.extend(polygons[0])
+            seam.extend(polygons[1])
+
+        tiling.run_tiles(
+            lambda window: rut.polygonize_tile(
+                band, window, height, width, nodata, int(self.connectivity), mask
+            ),
+            tiling.tile_windows(height, width, self.tile_size),
+            on_result=collect_tile,
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            progress_end=0.7,
+            message="Polygonized tile",
+        )
+
+        knut.check_canceled(exec_context)
+        exec_context.set_progress(0.7, "Merging polygons across tile borders...")
+        polygons = final + rut.merge_seam_polygons(seam, int(self.connectivity))
+
+        # polygons are computed in pixel coordinates and transformed to the raster CRS at once
+        transform = profile["transform"]
+        gdf = gp.GeoDataFrame(
+            {"value": [value for _, value in polygons]},
+            geometry=gp.GeoSeries([polygon for polygon, _ in polygons]).affine_transform(
+                [transform.a, transform.b, transform.d, transform.e, transform.c, transform.f]
+            ),
+            crs=profile["crs"].to_wkt() if profile.get("crs") else None,
+        )
+        return knut.to_table(gdf, exec_context)
+
+
+############################################
+# Rasterize Geometries
+############################################
+
+@knext.node(
+    name="Rasterize Geometries",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Reference Raster",
+    description="Raster image that defines the grid, transform and CRS of the output raster.",
+    id="rasterio.data.profile",
+)
+@knext.input_table(
+    name="Geometry Table",
+    description="Table containing the geometries and the values to burn into the raster.",
+)
+
+@knext.output_binary(
+    name="Rasterized Raster",
+    description="Single band raster aligned with the reference raster that contains the burned values.",
+    id="rasterio.data.profile",
+)
+
+class RasterizeNode:
+    geo_col = knext.ColumnParameter(
+        "Geometry Column", 
+        "Select the geometry column",
+        port_index=1, 
+        column_filter=knut.is_geo
+    )
+
+    value_col = knext.ColumnParameter(
+        "Value Column",
+        "Select the numeric column whose values are burned into the raster.",
+        port_index=1,
+        column_filter=knut.is_numeric,
+    )
+
+    merge = knext.StringParameter(
+        "Merge method",
+        """Select how the values of overlapping geometries are combined:
+
+        - **replace**: The value of the geometry that comes last in the table is used.
+        - **add**: The values of all overlapping geometries are summed up.
+        - **max**: The largest value of all overlapping geometries is used.""",
+        default_value="replace",
+        enum=["replace", "add", "max"],
+    )
+
+    all_touched = knext.BoolParameter(
+        "All touched",
+        """If checked, all pixels touched by a geometry are burned. 
+        If unchecked, only pixels whose center is within the geometry are burned.""",
+        default_value=False,
+    )
+
+    fill_value = knext.DoubleParameter(
+        "Fill value",
+        "The value of the pixels that are not covered by any geometry. It is used as nodata value of the output.",
+        default_value=0.0,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to burn the tiles in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    tile_size = knext.IntParameter(
+        "Tile size",
+        """The raster is burned in square tiles of this many pixels per side. 
+        Each tile only rasterizes the geometries that intersect it.""",
+        default_value=1024,
+        min_value=16,
+    )
+
+    def configure(self, configure_context, input_binary_schema, input_schema):
+        self.geo_col = knut.column_exists_or_preset(configure_context, self.geo_col, input_schema, knut.is_geo)
+        self.value_col = knut.column_exists_or_preset(configure_context, self.value_col, input_schema, knut.is_numeric)
+        return None
+
+    def execute(self, exec_context, imagedata, input_table):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        import geopandas as gp
+        import shapely
+        from rasterio.enums import MergeAlg
+        from rasterio.features import rasterize
+        from rasterio.windows import Window
+        from rasterio.windows import transform as window_transform
+        im_data, profile, bounds, _ = rut.load_raster(imagedata)
+
+        gdf = gp.GeoDataFrame(input_table.to_pandas(), geometry=self.geo_col)
+        gdf = gdf.to_crs(profile['crs'])
+        gdf = gdf[~(gdf.geometry.isna() | gdf.geometry.is_empty) & gdf[self.value_col].notna()]
+
+        geometries = gdf.geometry.to_numpy()
+        values = gdf[self.value_col].to_numpy()
+        dtype = np.dtype("int32") if np.issubdtype(values.dtype, np.integer) else np.dtype("float32")
+        if self.merge == "max":
+            # burning in ascending order keeps the largest value
+            order = np.argsort(values, kind="stable")
+            geometries = geometries[order]
+            values = values[order]
+        tree = shapely.STRtree(geometries)
+
+        height, width = im_data.shape[1:]
+        transform = profile["transform"]
+        result = np.full((1, height, width), self.fill_value, dtype=dtype)
+
+        def burn_tile(window):
+            row_start, row_stop, col_start, col_stop = window
+            tile_transform = window_transform(
+                Window(col_start, row_start, col_stop - col_start, row_stop - row_start), transform
+            )
+            corners = [tile_transform * corner for corner in
+                       ((0, 0), (col_stop - col_start, 0), (0, row_stop - row_start),
+                        (col_stop - col_start, row_stop - row_start))]
+            # the tree returns the geometries in table order which keeps the replace semantics
+            hits = np.sort(tree.query(shapely.box(
+                min(x for x, _ in corners), min(y for _, y in corners),
+                max(x for x, _ in corners), max(y for _, y in corners),
+            )))
+            if len(hits) == 0:
+                return None
+            out_shape = (row_stop - row_start, col_stop - col_start)
+            shapes = list(zip(geometries[hits], values[hits]))
+            if self.merge != "add":
+                return rasterize(
+                    shapes, out_shape=out_shape, transform=tile_transform, fill=self.fill_value,
+                    all_touched=self.all_touched, dtype=dtype,
+                )
+            burned = rasterize(
+                shapes, out_shape=out_shape, transform=tile_transform, fill=0,
+                all_touched=self.all_touched, merge_alg=MergeAlg.add, dtype=dtype,
+            )
+            covered = rasterize(
+                [(geometry, 1) for geometry in geometries[hits]], out_shape=out_shape,
+                transform=tile_transform, fill=0, all_touched=self.all_touched, dtype="uint8",
+            )
+            burned[covered == 0] = self.fill_value
+            return burned
+
+        tiling.run_tiles(
+            burn_tile,
+            tiling.tile_windows(height, width, self.tile_size),
+            out=result,
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            message="Burned tile",
+        )
+
+        new_profile = profile.copy()
+        new_profile.update({
+            "count": 1,
+            "dtype": dtype.name,
+            "nodata": self.fill_value,
+        })
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        return rut.dump_raster(result, new_profile, bounds)
+
+
+############################################
+# Align Rasters
+############################################
+
+@knext.node(
+    name="Align Rasters",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_table(
+    name="Raster Table",
+    description="""Table with one serialized raster image per row e.g. several dates or sensors of the same 
+    area. The rasters are stacked in the order of the rows.""",
+)
+
+@knext.output_binary(
+    name="Aligned Raster Stack",
+    description="""Multi-band raster with the bands of all input rasters on a common grid. 
+    The stack keeps the names of its bands, so stacks can be aligned again without losing the origin 
+    of their bands.""",
+    id="rasterio.data.profile",
+)
+@knext.output_table(
+    name="Band Mapping",
+    description="Table that maps each band of the stack to its input raster and source band.",
+)
+
+class AlignRastersNode:
+    raster_col = knext.ColumnParameter(
+        "Raster column",
+        "Select the column with the serialized raster images.",
+        port_index=0,
+        column_filter=knut.is_binary,
+    )
+
+    name_col = knext.ColumnParameter(
+        "Raster name column",
+        """Select the column with the name of each raster that is used in the band mapping. 
+        If none is selected the row IDs are used.""",
+        port_index=0,
+        column_filter=knut.is_int_or_string,
+        include_none_column=True,
+    )
+
+    target_crs = knext.StringParameter(
+        "Target CRS",
+        """Enter the [Coordinate reference system (CRS)](https://en.wikipedia.org/wiki/Spatial_reference_system) 
+        of the common grid e.g. 'EPSG:32633'. Leave empty to use the CRS of the raster in the first row.""",
+        default_value="",
+    )
+
+    resolution = knext.DoubleParameter(
+        "Resolution",
+        """The pixel size of the common grid in units of the target CRS. 
+        Use 0 to use the resolution of the raster in the first row.""",
+        default_value=0.0,
+        min_value=0.0,
+    )
+
+    extent = knext.StringParameter(
+        "Extent",
+        """Select the extent of the common grid:
+
+        - **intersection**: The area covered by all rasters.
+        - **union**: The area covered by any of the rasters. Pixels outside of a raster are nodata in its 
+        bands or, if no raster has a nodata value, invalid in all bands.
+        - **first**: The extent of the raster in the first row.""",
+        default_value="intersection",
+        enum=["intersection", "union", "first"],
+    )
+
+    resampling = knext.StringParameter(
+        "Resampling method",
+        """Select the [resampling method](https://rasterio.readthedocs.io/en/stable/api/rasterio.enums.html#rasterio.enums.Resampling) 
+        used to compute the pixel values on the common grid.""",
+        default_value="nearest",
+        enum=rut.RESAMPLING_METHODS,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used for warping. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    def configure(self, configure_context, input_schema):
+        self.raster_col = knut.column_exists_or_preset(configure_context, self.raster_col, input_schema, knut.is_binary)
+        return None
+
+    def execute(self, exec_context, input_table):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        import pandas as pd
+        from rasterio.crs import CRS
+
+        df = input_table.to_pandas()
+        df = df[df[self.raster_col].notna()]
+        if len(df) < 2:
+            raise ValueError("The input table needs to contain at least two raster images.")
+        # the none selection of the name column is either None or the none column name
+        names = (
+            df[self.name_col].astype(str).tolist()
+            if self.name_col in df.columns else [str(row_id) for row_id in df.index]
+        )
+
+        rasters = []
+        band_names = []
+        for data in df[self.raster_col]:
+            im_data, profile, bounds, mask, extras = rut.load_raster(data, with_extras=True)
+            # GDAL only knows about nodata values so masked pixels are written as nodata before warping
+            im_data, nodata = rut.mask_to_nodata(im_data, profile.get("nodata"), mask)
+            profile = profile.copy()
+            profile["nodata"] = nodata
+            rasters.append((im_data, profile, bounds))
+            band_names.append(extras.get("band_names") or [f"Band_{band + 1}" for band in range(im_data.shape[0])])
+        profiles = [profile for _, profile, _ in rasters]
+
+        dst_crs = CRS.from_user_input(self.target_crs) if self.target_crs else profiles[0]["crs"]
+        try:
+            transform, height, width = rut.common_grid(profiles, dst_crs, self.resolution, self.extent)
+        except ValueError as e:
+            raise knext.InvalidParametersError(str(e))
+
+        # the stack uses one data type and nodata value for all bands
+        dtype = np.result_type(*[im_data.dtype for im_data, _, _ in rasters])
+        if np.issubdtype(dtype, np.floating):
+            nodata = np.nan
+        else:
+            defined = [p.get("nodata") for p in profiles if p.get("nodata") is not None]
+            nodata = defined[0] if defined else None
+
+        stack = []
+        mapping = []
+        new_mask = None
+        for i, (im_data, profile, _) in enumerate(rasters):
+            knut.check_canceled(exec_context)
+            if nodata is None:
+                # without nodata value the bands of uncovered pixels are filled with 0, so the mask marks the
+                # pixels that are not covered by all input rasters as invalid
+                coverage = rut.coverage_mask(
+                    im_data.shape[1],
+                    im_data.shape[2],
+                    profile["transform"],
+                    profile["crs"],
+                    transform,
+                    dst_crs,
+                    height,
+                    width,
+                    num_threads=self.num_threads,
+                )
+                new_mask = coverage if new_mask is None else new_mask & coverage
+            stack.append(rut.warp_to_grid(
+                im_data,
+                profile["transform"],
+                profile["crs"],
+                transform,
+                dst_crs,
+                height,
+                width,
+                resampling=self.resampling,
+                nodata=profile.get("nodata"),
+                dst_nodata=nodata,
+                dst_dtype=dtype,
+                num_threads=self.num_threads,
+                exec_context=exec_context,
+                progress_start=0.1 + 0.8 * i / len(rasters),
+                progress_end=0.1 + 0.8 * (i + 1) / len(rasters),
+            ))
+            for source_band in band_names[i]:
+                mapping.append({
+                    "Band": f"Band_{len(mapping) + 1}",
+                    "Input": names[i],
+                    "Source band": source_band,
+                })
+
+        aligned = np.concatenate(stack, axis=0)
+        new_profile = profiles[0].copy()
+        new_profile.update({
+            "crs": dst_crs,
+            "count": aligned.shape[0],
+            "dtype": aligned.dtype.name,
+            "nodata": nodata,
+            "height": height,
+            "width": width,
+            "transform": transform,
+        })
+        new_bounds = rut.bounds_from_transform(transform, width, height)
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        # the bands are named after their origin so another alignment of the stack keeps it
+        extras = {"band_names": [f"{row['Input']}/{row['Source band']}" for row in mapping]}
+        return (
+            rut.dump_raster(aligned, new_profile, new_bounds, new_mask, extras),
+            knext.Table.from_pandas(pd.DataFrame(mapping)),
+        )
+
+
+############################################
+# Reclassify Raster
+############################################
+
+@knext.node(
+    name="Reclassify Raster",
+    node_type=knext.NodeType.MANIPULATOR,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "TableToGeoImage.png"  # Uses the global icon path definition
+)
+
+@knext.input_binary(
+    name="Input Raster",
+    description="Raster image whose values are reclassified.",
+    id="rasterio.data.profile",
+)
+
+@knext.output_binary(
+    name="Reclassified Raster",
+    description="Raster with the classes of all bands in the smallest data type that holds all classes.",
+    id="rasterio.data.profile",
+)
+
+class ReclassifyRasterNode:
+    mode = knext.StringParameter(
+        "Mapping type",
+        """Select how the rules map the pixel values to classes:
+
+        - **ranges**: Rules of the form lower:upper=class where the lower bound is inclusive and the upper bound 
+        exclusive. Leave a bound empty for an open range e.g. ":0=1; 0:500=2; 500:=3".
+        - **values**: Rules of the form value=class e.g. "1=10; 2=10; 3=20".""",
+        default_value="ranges",
+        enum=["ranges", "values"],
+    )
+
+    rules = knext.StringParameter(
+        "Rules",
+        "The reclassification rules separated by semicolons.",
+        default_value=":0=1; 0:500=2; 500:=3",
+    )
+
+    keep_unmapped = knext.BoolParameter(
+        "Keep unmapped values",
+        """If checked values that no rule applies to keep their original value, 
+        otherwise they are set to the output nodata value.""",
+        default_value=False,
+    )
+
+    out_nodata = knext.DoubleParameter(
+        "Output nodata value",
+        "The value of nodata pixels and, unless they are kept, of unmapped values.",
+        default_value=0.0,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to reclassify the row blocks in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    rows_per_chunk = knext.IntParameter(
+        "Rows per chunk",
+        "The number of rows that are reclassified at once.",
+        default_value=512,
+        min_value=1,
+    )
+
+    def _get_rules(self):
+        try:
+            return rut.parse_reclass_rules(self.rules, self.mode)
+        except ValueError as e:
+            raise knext.InvalidParametersError(str(e))
+
+    def configure(self, configure_context, input_binary_schema):
+        self._get_rules()
+        return None
+
+    def execute(self, exec_context, imagedata):
+        exec_context.set_progress(0.1, "Profile and metadata extracted...")
+
+        import numpy as np
+        im_data, profile, bounds, mask = rut.load_raster(imagedata)
+
+        rules = self._get_rules()
+        nodata = profile.get("nodata")
+        dtype = rut.reclass_dtype(rules, im_data.dtype, self.keep_unmapped, self.out_nodata)
+        # 8 and 16 bit rasters are reclassified with a lookup table of all possible values
+        lut = rut.reclass_lut(rules, im_data.dtype, dtype, nodata, self.keep_unmapped, self.out_nodata)
+        _, height, width = im_data.shape
+        result = np.empty(im_data.shape, dtype=dtype)
+
+        def reclassify_chunk(window):
+            row_start, row_stop, col_start, col_stop = window
+            # the classes are written directly into the output array
+            rut.reclassify(
+                tiling.read_window(im_data, window),
+                rules,
+                result[:, row_start:row_stop, col_start:col_stop],
+                nodata,
+                self.keep_unmapped,
+                self.out_nodata,
+                lut,
+                None if mask is None else mask[row_start:row_stop, col_start:col_stop],
+            )
+
+        tiling.run_tiles(
+            reclassify_chunk,
+            tiling.row_windows(height, width, self.rows_per_chunk),
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            message="Reclassified chunk",
+        )
+
+        new_profile = profile.copy()
+        new_profile.update({
+            "dtype": dtype.name,
+            "nodata": self.out_nodata,
+        })
+
+        exec_context.set_progress(0.9, "Serializing output data...")
+        return rut.dump_raster(result, new_profile, bounds)
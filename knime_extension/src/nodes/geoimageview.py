@@ -1,5 +1,7 @@
 import knime_extension as knext
 import util.knime_utils as knut
+import util.raster_utils as rut
+import util.view_utils as vut
 
 __category = knext.category(
     path="/community/geoimage",
@@ -8,7 +10,7 @@ __category = knext.category(
     description="Nodes that visualize spatial image data in various formats.",
     # starting at the root folder of the extension_module parameter in the knime.yml file
     icon="icons/icon/ViewCategory.png",
-    after="geoimagetransform",
+    after="geoimageanalysis",
 )
 
 # Root path for all node icons in this file
@@ -51,10 +53,7 @@ class GeoImageViewNode:
         "Color map",
         "Select the color map for visualization.",
         default_value="viridis",
-        enum=[ 
-            "viridis", "plasma", "inferno", "magma", "cividis", "Greys", "Purples", 
-            "Blues", "Greens", "Oranges", "Reds", "YlOrBr", "YlGnBu", "cool", "hot", "spring"
-        ]
+        enum=vut.COLOR_MAPS,
     )
 
     opacity = knext.DoubleParameter(
@@ -72,76 +71,142 @@ class GeoImageViewNode:
             The default base map is 'OpenStreetMap'.
             See [Folium base maps](https://python-visualization.github.io/folium/quickstart.html#Tiles).""",
             default_value="OpenStreetMap",
-            enum=[
-                "CartoDB DarkMatter",
-                "CartoDB DarkMatterNoLabels",
-                "CartoDB DarkMatterOnlyLabels",
-                "CartoDB Positron",
-                "CartoDB PositronNoLabels",
-                "CartoDB PositronOnlyLabels",
-                "CartoDB Voyager",
-                "CartoDB VoyagerLabelsUnder",
-                "CartoDB VoyagerNoLabels",
-                "CartoDB VoyagerOnlyLabels",
-                "Esri DeLorme",
-                "Esri NatGeoWorldMap",
-                "Esri OceanBasemap",
-                "Esri WorldGrayCanvas",
-                "Esri WorldImagery",
-                "Esri WorldPhysical",
-                "Esri WorldShadedRelief",
-                "Esri WorldStreetMap",
-                "Esri WorldTerrain",
-                "Esri WorldTopoMap",
-                "Gaode Normal",
-                "Gaode Satellite",
-                "NASAGIBS ASTER_GDEM_Greyscale_Shaded_Relief",
-                "NASAGIBS BlueMarble",
-                "NASAGIBS BlueMarble3031",
-                "NASAGIBS BlueMarble3413",
-                "NASAGIBS ModisAquaBands721CR",
-                "NASAGIBS ModisAquaTrueColorCR",
-                "NASAGIBS ModisTerraAOD",
-                "NASAGIBS ModisTerraBands367CR",
-                "NASAGIBS ModisTerraBands721CR",
-                "NASAGIBS ModisTerraChlorophyll",
-                "NASAGIBS ModisTerraLSTDay",
-                "NASAGIBS ModisTerraSnowCover",
-                "NASAGIBS ModisTerraTrueColorCR",
-                "NASAGIBS ViirsEarthAtNight2012",
-                "NASAGIBS ViirsTrueColorCR",
-                "OpenRailwayMap",
-                "OpenStreetMap",
-                "Stamen Terrain",
-                "Stamen TerrainBackground",
-                "Stamen TerrainLabels",
-                "Stamen Toner",
-                "Stamen TonerBackground",
-                "Stamen TonerHybrid",
-                "Stamen TonerLabels",
-                "Stamen TonerLines",
-                "Stamen TonerLite",
-                "Stamen TopOSMFeatures",
-                "Stamen TopOSMRelief",
-                "Stamen Watercolor",
-                "Strava All",
-                "Strava Ride",
-                "Strava Run",
-                "Strava Water",
-                "Strava Winter",
-            ],
+            enum=vut.BASE_MAPS,
     )
     
+    stretch = knext.StringParameter(
+        "Contrast stretch",
+        """Select which values of each band are mapped to the lowest and highest color:
+
+        - **min-max**: The minimum and maximum of the band.
+        - **percentile**: The lower and upper percentile of a regular sample of the pixels, which keeps a few 
+        extreme values from washing out the colors.
+
+        Statistics stored in the raster e.g. by the GeoTIFF reader are used without scanning the pixels 
+        and the computed values are reused by later executions for the same raster.""",
+        default_value="min-max",
+        enum=vut.STRETCH_METHODS,
+    )
+
+    lower_percent = knext.DoubleParameter(
+        "Lower percentile",
+        "The percentile (0-100) that is mapped to the lowest color of the percentile stretch.",
+        default_value=2.0,
+        min_value=0.0,
+        max_value=100.0,
+    )
+
+    upper_percent = knext.DoubleParameter(
+        "Upper percentile",
+        "The percentile (0-100) that is mapped to the highest color of the percentile stretch.",
+        default_value=98.0,
+        min_value=0.0,
+        max_value=100.0,
+    )
+
+    max_pixels = knext.IntParameter(
+        "Maximum display pixels",
+        """The maximum number of pixels of the displayed image. Larger rasters are reduced by an integer 
+        factor before they are colorized, which bounds the size of the view and the time to create it. 
+        Use 0 to display all pixels.""",
+        default_value=2000000,
+        min_value=0,
+    )
+
+    downsampling = knext.StringParameter(
+        "Downsampling method",
+        """Select how larger rasters are reduced to the display size:
+
+        - **average**: The mean of the valid pixels of each block.
+        - **decimate**: Every n-th pixel, which is faster and keeps the original values e.g. of classes.""",
+        default_value="average",
+        enum=vut.DOWNSAMPLING_METHODS,
+    )
+
+    rendering = knext.StringParameter(
+        "Rendering",
+        """Select how the raster is added to the map:
+
+        - **overlay**: A single image with at most the maximum display pixels that is embedded in the view.
+        - **tiles**: A Web Mercator tile pyramid that is rendered into the tile cache directory and loaded 
+        per zoom level, which shows the full detail of large rasters when zooming in. The view needs 
+        to be able to access the local tile files.""",
+        default_value="overlay",
+        enum=["overlay", "tiles"],
+    )
+
+    zoom_levels = knext.IntParameter(
+        "Number of zoom levels",
+        """The number of zoom levels of the tile pyramid, starting at the zoom level that matches the 
+        resolution of the raster. Each coarser level has a quarter of the tiles of the next finer level.""",
+        default_value=5,
+        min_value=1,
+        max_value=22,
+    )
+
+    tile_dir = knext.StringParameter(
+        "Tile cache directory",
+        """The directory the tile pyramids are written to. Each raster and setting combination gets its own 
+        sub directory which is reused by later executions. Leave empty to use the temporary directory.""",
+        default_value="",
+    )
+
+    tile_cache_size = knext.IntParameter(
+        "Tile cache size (MB)",
+        """The size of the tile cache directory. The least recently used tile pyramids are removed once it 
+        is full. Use 0 to keep all tile pyramids.""",
+        default_value=1024,
+        min_value=0,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to reproject the image and to render the tiles in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    compression = knext.IntParameter(
+        "PNG compression level",
+        """The zlib compression level (0-9) of the rendered PNG images. 
+        Lower levels are faster, higher levels create smaller views and tiles.""",
+        default_value=6,
+        min_value=0,
+        max_value=9,
+    )
+
+    cache_size = knext.IntParameter(
+        "View cache size (MB)",
+        """The size of the cache of rendered views in the temporary directory. Views of unchanged rasters 
+        with the same settings are loaded from the cache instead of being rendered again. The least recently 
+        used views are removed once the cache is full. Use 0 to disable the cache.""",
+        default_value=256,
+        min_value=0,
+    )
+
     def configure(self, configure_context, input_binary_schema):
-        # No special configuration required for this node
+        if self.stretch == "percentile" and self.lower_percent >= self.upper_percent:
+            raise knext.InvalidParametersError("The lower percentile must be smaller than the upper percentile.")
         return None
     
     def execute(self, exec_context, imagedata):
         exec_context.set_progress(0.1, "Processing raster data...")
 
+        # overlay views are cached completely, tile views are backed by the tile cache
+        key = vut.payload_key(imagedata)
+        cache_key = vut.view_cache_key(key, (
+            "GeoImageView", self.band_selection, self.color_map, self.opacity, self.base_map, self.stretch,
+            self.lower_percent, self.upper_percent, self.max_pixels, self.downsampling, self.compression,
+        ))
+        if self.rendering == "overlay" and self.cache_size > 0:
+            html = vut.read_view_cache(vut.view_cache_dir(), cache_key)
+            if html is not None:
+                return knext.view(html.decode("utf-8"))
+
         # get imagedata
-        import pickle
-        img, profile, bounds = pickle.loads(imagedata)
+        img, profile, bounds, mask, extras = rut.load_raster(imagedata, with_extras=True)
+        source, source_mask = img, mask
 
         # get band
         bands = [int(band) - 1 for band in self.band_selection.split(',')]
@@ -149,57 +214,101 @@ class GeoImageViewNode:
         # EPSG to EPSG:4326
         from rasterio.warp import transform_bounds
         import folium
-        import matplotlib.pyplot as plt
-        import numpy as np
-        left, bottom, right, top = bounds
+
+        # reduce the selected bands to the display size, nodata and masked pixels become NaN so they
+        # neither affect the normalization nor get colored
+        factor = vut.display_factor(img.shape[1], img.shape[2], self.max_pixels)
+        band_indices = bands
+        img = vut.downsample(img, bands, factor, self.downsampling, profile.get("nodata"), mask)
+        bands = list(range(len(bands)))
+        exec_context.set_progress(0.5, "Colorizing raster data...")
+
+        # the downsampled image covers whole blocks and can extend the raster by less than a block
+        if factor > 1:
+            left, bottom, right, top = rut.bounds_from_transform(
+                vut.display_transform(profile['transform'], factor), img.shape[2], img.shape[1]
+            )
+        else:
+            left, bottom, right, top = bounds
         bounds = transform_bounds(profile['crs'], 'EPSG:4326', left, bottom, right, top)
 
-        if len(bands) == 1:
-            # single band
-            band = img[bands[0]]
-            band_norm = (band - np.nanmin(band)) / (np.nanmax(band) - np.nanmin(band))
+        # the stretch is computed once for the whole raster so all tiles use the same colors
+        vmin, vmax = vut.stretch_range(
+            source, band_indices, self.stretch, self.lower_percent, self.upper_percent,
+            profile.get("nodata"), source_mask, extras.get("stats"), key, img,
+        )
+
+        if self.rendering == "tiles" and len(bands) in (1, 3):
+            mercator_bounds = transform_bounds(
+                profile['crs'], 'EPSG:3857', *rut.bounds_from_transform(profile['transform'], source.shape[2], source.shape[1])
+            )
+            max_zoom = vut.native_zoom(mercator_bounds, source.shape[2])
+            min_zoom = max(max_zoom - self.zoom_levels + 1, 0)
+
+            import hashlib
+            import os
+            import tempfile
+            from pathlib import Path
+            tile_key = hashlib.blake2b(key.encode(), digest_size=16)
+            tile_key.update(repr((
+                self.band_selection, self.color_map, self.downsampling, self.max_pixels, self.zoom_levels,
+                self.compression, self.stretch, self.lower_percent, self.upper_percent,
+            )).encode())
+            tile_dir = os.path.join(
+                self.tile_dir or os.path.join(tempfile.gettempdir(), "knime_geoimage_tiles"), tile_key.hexdigest()
+            )
+            # a complete pyramid of the same raster and settings is reused
+            complete_marker = os.path.join(tile_dir, "complete")
+            if not os.path.exists(complete_marker):
+                exec_context.set_progress(0.2, f"Rendering tiles for zoom levels {min_zoom} to {max_zoom}...")
+                os.makedirs(tile_dir, exist_ok=True)
+                vut.build_tile_pyramid(
+                    source, band_indices, profile, source_mask, vmin, vmax, self.color_map, tile_dir,
+                    min_zoom, max_zoom, self.downsampling, self.num_threads, exec_context, self.compression,
+                )
+                open(complete_marker, "w").close()
+            # the pyramid is marked as recently used and older ones are removed once the cache is full
+            os.utime(tile_dir)
+            if self.tile_cache_size > 0:
+                vut.evict_least_recently_used(os.path.dirname(tile_dir), self.tile_cache_size * 1024 ** 2, tile_dir)
 
-            # olium 
             m = folium.Map(location=[(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2],
                            tiles=self.base_map)
             m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
-
-            # map
-            cmap = plt.get_cmap(self.color_map)
-
-            # overlay
-            image_overlay = folium.raster_layers.ImageOverlay(
-                band_norm,
-                bounds=[[bounds[1], bounds[0]], [bounds[3], bounds[2]]],
+            folium.raster_layers.TileLayer(
+                tiles=Path(tile_dir).as_uri() + "/{z}/{x}/{y}.png",
+                attr="GeoImage",
+                name="Raster",
+                overlay=True,
                 opacity=self.opacity,
-                colormap=lambda x: cmap(x),
+                min_zoom=0,
+                max_zoom=22,
+                min_native_zoom=min_zoom,
+                max_native_zoom=max_zoom,
+            ).add_to(m)
+
+        elif len(bands) in (1, 3):
+            # the overlay is placed in Web Mercator so the display array is warped instead of stretching it
+            # between the corners of its bounds
+            exec_context.set_progress(0.6, "Reprojecting raster data...")
+            img, bounds = vut.warp_to_mercator(
+                img, vut.display_transform(profile['transform'], factor), profile['crs'], self.num_threads
             )
-            image_overlay.add_to(m)
-
-        elif len(bands) == 3:
-            # (RGB)
-            r = img[bands[0]]
-            g = img[bands[1]]
-            b = img[bands[2]]
-
-            # Normalization
-            r_norm = (r - np.nanmin(r)) / (np.nanmax(r) - np.nanmin(r))
-            g_norm = (g - np.nanmin(g)) / (np.nanmax(g) - np.nanmin(g))
-            b_norm = (b - np.nanmin(b)) / (np.nanmax(b) - np.nanmin(b))
 
-            # Stack
-            rgb_image = np.dstack((r_norm, g_norm, b_norm))
+            # single band with color map or RGB, stretched between vmin and vmax of each band
+            rgba = vut.colorize(img, vmin, vmax, self.color_map)
+            png = vut.encode_png(rgba, self.compression)
 
             # Folium 
             m = folium.Map(location=[(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2],
                            tiles=self.base_map)
             m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
 
-            # overlay
+            # overlay with the encoded PNG so folium does not need to convert the array
             image_overlay = folium.raster_layers.ImageOverlay(
-                rgb_image,
+                vut.png_data_url(png),
                 bounds=[[bounds[1], bounds[0]], [bounds[3], bounds[2]]],
-                opacity=self.opacity
+                opacity=self.opacity,
             )
             image_overlay.add_to(m)
 
@@ -211,6 +320,8 @@ class GeoImageViewNode:
 
         # HTML for KNIME view
         html = m.get_root().render()
+        if self.rendering == "overlay":
+            vut.write_view_cache(vut.view_cache_dir(), cache_key, html.encode("utf-8"), self.cache_size * 1024 ** 2)
         return knext.view(html)       
     
 
@@ -231,6 +342,11 @@ class GeoImageViewNode:
     id="rasterio.data.profile",
 )
 
+@knext.output_image(
+    name="Static Image",
+    description="The static image view of the input geo-image as PNG or SVG image e.g. for reports.",
+)
+
 @knext.output_view(
     name="Static Image View",
     description="Displays a static image view of the input geo-image.",
@@ -248,90 +364,435 @@ class GeoImageViewStaticNode:
         "Color map",
         "Select the color map for visualization.",
         default_value="viridis",
-        enum=[ 
-            "viridis", "plasma", "inferno", "magma", "cividis", "Greys", "Purples", 
-            "Blues", "Greens", "Oranges", "Reds", "YlOrBr", "YlGnBu", "cool", "hot", "spring"
-        ]
+        enum=vut.COLOR_MAPS,
+    )
+
+    stretch = knext.StringParameter(
+        "Contrast stretch",
+        """Select which values of each band are mapped to the lowest and highest color:
+
+        - **fixed**: The min and max value below. RGB bands are drawn with their original values.
+        - **min-max**: The minimum and maximum of a regular sample of the pixels of each band.
+        - **percentile**: The lower and upper percentile of a regular sample of the pixels of each band, 
+        which keeps a few extreme values from washing out the colors.
+
+        Statistics stored in the raster e.g. by the GeoTIFF reader are used without scanning the pixels 
+        and the computed values are reused by later executions for the same raster.""",
+        default_value="fixed",
+        enum=["fixed"] + vut.STRETCH_METHODS,
     )
 
     vmin = knext.DoubleParameter(
         "Min Value",
-        "Set the minimum value for the color scale.",
+        "Set the minimum value for the color scale of the fixed stretch.",
         default_value=0.1,
     )
     
     vmax = knext.DoubleParameter(
         "Max Value",
-        "Set the maximum value for the color scale.",
+        "Set the maximum value for the color scale of the fixed stretch.",
         default_value=1,
     )
 
+    lower_percent = knext.DoubleParameter(
+        "Lower percentile",
+        "The percentile (0-100) that is mapped to the lowest color of the percentile stretch.",
+        default_value=2.0,
+        min_value=0.0,
+        max_value=100.0,
+    )
+
+    upper_percent = knext.DoubleParameter(
+        "Upper percentile",
+        "The percentile (0-100) that is mapped to the highest color of the percentile stretch.",
+        default_value=98.0,
+        min_value=0.0,
+        max_value=100.0,
+    )
+
+    image_type = knext.StringParameter(
+        "Image format",
+        "The format of the image at the output port.",
+        default_value="PNG",
+        enum=["PNG", "SVG"],
+    )
+
+    dpi = knext.IntParameter(
+        "Resolution (DPI)",
+        """The resolution of the 8 x 6 inch figure. Larger rasters are reduced to the pixel size of the 
+        figure by picking every n-th pixel before they are drawn.""",
+        default_value=100,
+        min_value=10,
+        max_value=600,
+    )
+
+    cache_size = knext.IntParameter(
+        "View cache size (MB)",
+        """The size of the cache of rendered views in the temporary directory. Views of unchanged rasters 
+        with the same settings are loaded from the cache instead of being rendered again. The least recently 
+        used views are removed once the cache is full. Use 0 to disable the cache.""",
+        default_value=256,
+        min_value=0,
+    )
+
     def configure(self, configure_context, input_binary_schema):
-            # No special configuration required for this node
-        return None
+        if self.stretch == "percentile" and self.lower_percent >= self.upper_percent:
+            raise knext.InvalidParametersError("The lower percentile must be smaller than the upper percentile.")
+        return knext.ImagePortObjectSpec(knext.ImageFormat[self.image_type])
 
     def execute(self, exec_context, imagedata):
         exec_context.set_progress(0.1, "Loading raster data and metadata...")
 
-        import pickle
+        # the view shows the exported image, so both are restored from the cache at once
+        key = vut.payload_key(imagedata)
+        cache_key = vut.view_cache_key(key, (
+            "GeoImageViewStatic", self.band_selection, self.color_map, self.stretch, self.vmin, self.vmax,
+            self.lower_percent, self.upper_percent, self.image_type, self.dpi,
+        ))
+        image = vut.read_view_cache(vut.view_cache_dir(), cache_key) if self.cache_size > 0 else None
+        if image is not None:
+            return image, self._image_view(image)
+
         import matplotlib.pyplot as plt
         from io import BytesIO
         import re
         import numpy as np
 
         # Deserialize raster data
-        im_data, profile, bounds = pickle.loads(imagedata)
+        im_data, profile, _, mask, extras = rut.load_raster(imagedata, with_extras=True)
 
         # Parse the band selection (either single band or RGB bands)
         bands = list(map(int, re.split(r'\s*,\s*', self.band_selection)))
+        if len(bands) not in (1, 3):
+            raise ValueError("Please select either 1 or 3 bands for visualization.")
 
-        if len(bands) == 1:
-            # Single-band grayscale visualization
-            raster_data = im_data[bands[0] - 1]  # Band indices start from 1, but im_data uses 0-based indexing
-
-            exec_context.set_progress(0.3, "Creating grayscale plot...")
+        # the figure can not show more pixels than it has, so only every n-th pixel of larger rasters is drawn
+        width_inches, height_inches = 8, 6
+        factor = vut.display_factor(
+            im_data.shape[1], im_data.shape[2], width_inches * height_inches * self.dpi ** 2
+        )
+        display = vut.downsample(
+            im_data, [b - 1 for b in bands], factor, "decimate", profile.get("nodata"), mask
+        )
+        left, bottom, right, top = rut.bounds_from_transform(
+            vut.display_transform(profile["transform"], factor), display.shape[2], display.shape[1]
+        )
+
+        if self.stretch == "fixed":
+            vmin, vmax = np.full(len(bands), self.vmin), np.full(len(bands), self.vmax)
+        else:
+            vmin, vmax = vut.stretch_range(
+                im_data, [b - 1 for b in bands], self.stretch, self.lower_percent, self.upper_percent,
+                profile.get("nodata"), mask, extras.get("stats"), key, display,
+            )
 
-            fig, ax = plt.subplots()
+        fig, ax = plt.subplots()
 
-            # Display the single band with a color map
-            im = ax.imshow(raster_data, cmap=self.color_map, vmin=self.vmin, vmax=self.vmax)
+        if len(bands) == 1:
+            # Single-band visualization, nodata and masked pixels are not drawn
+            exec_context.set_progress(0.3, "Creating grayscale plot...")
+            im = ax.imshow(
+                np.ma.masked_invalid(display[0]), cmap=self.color_map, vmin=vmin[0], vmax=vmax[0],
+                extent=(left, right, bottom, top), interpolation="nearest",
+            )
 
             # Add colorbar
             cbar = fig.colorbar(im, ax=ax, orientation='horizontal', shrink=0.99)
             cbar.set_label('Value')
 
-        elif len(bands) == 3:
-            # RGB visualization
+        else:
+            # RGB visualization with transparent nodata and masked pixels
             exec_context.set_progress(0.3, "Creating RGB plot...")
+            if self.stretch == "fixed":
+                # the original values are drawn like matplotlib draws RGB arrays
+                vmin = np.zeros(3)
+                vmax = np.full(3, 255 if np.issubdtype(im_data.dtype, np.integer) else 1)
+            ax.imshow(
+                vut.colorize(display, vmin, vmax), extent=(left, right, bottom, top), interpolation="nearest"
+            )
 
-            # Stack selected bands into an RGB array (shape: [height, width, 3])
-            raster_data = np.stack([im_data[b - 1] for b in bands], axis=-1)
+        # Set image title and label the axes with the coordinates of the raster
+        ax.set_title("Static GeoImage View", fontsize=14)
+        crs = profile.get("crs")
+        if crs is not None and crs.is_geographic:
+            ax.set_xlabel("Longitude")
+            ax.set_ylabel("Latitude")
+        else:
+            ax.set_xlabel("X")
+            ax.set_ylabel("Y")
 
-            fig, ax = plt.subplots()
+        fig.set_size_inches(width_inches, height_inches)
 
-            # Display RGB image
-            ax.imshow(raster_data)
+        exec_context.set_progress(0.6, "Exporting plot...")
 
-        else:
-            raise ValueError("Please select either 1 or 3 bands for visualization.")
+        # Save figure to buffer in the selected image format (SVG/PNG)
+        out_image_buffer = BytesIO()
+        fig.savefig(out_image_buffer, format=self.image_type.lower(), dpi=self.dpi, bbox_inches='tight', pad_inches=0.1)
 
-        # Set image title
-        ax.set_title("Static GeoImage View", fontsize=14)
+        image = out_image_buffer.getvalue()
+        plt.close(fig)
+        vut.write_view_cache(vut.view_cache_dir(), cache_key, image, self.cache_size * 1024 ** 2)
 
-        # Optionally turn off the axis
-        ax.set_axis_off()
+        exec_context.set_progress(0.9, "Rendering view...")
 
-        fig.set_size_inches(8, 6)
+        # Return image data and KNIME view
+        return image, self._image_view(image)
 
-        exec_context.set_progress(0.6, "Exporting plot...")
+    def _image_view(self, image: bytes):
+        if self.image_type == "SVG":
+            return knext.view_svg(image.decode("utf-8"))
+        return knext.view_png(image)
 
-        # Create in-memory image buffer
-        # out_image_buffer = BytesIO()
 
-        # # Save figure to buffer in the selected image format (SVG/PNG)
-        # fig.savefig(out_image_buffer, format=self.image_type.lower(), bbox_inches='tight', pad_inches=0.1)
+############################################
+# GeoImage Layer View
+############################################
 
-        exec_context.set_progress(0.9, "Rendering view...")
+@knext.node(
+    name="GeoImage Layer View",
+    node_type=knext.NodeType.VISUALIZER,
+    category=__category,  # Uses the global category definition
+    icon_path=__NODE_ICON_PATH + "GeoImageView.png"  # Uses the global icon path definition
+)
 
-        # Return image data and KNIME view
-        return  knext.view_matplotlib(fig)
+@knext.input_table(
+    name="Raster Table",
+    description="""Table with one serialized raster image per row e.g. the output of the Batch Clip Raster by 
+    Polygons node or several dates or products of the same area.""",
+)
+
+@knext.output_view(
+    name="Raster Layer View",
+    description="Interactive map with one toggleable overlay per raster of the input table.",
+)
+
+class GeoImageLayerViewNode:
+    raster_col = knext.ColumnParameter(
+        "Raster column",
+        "Select the column with the serialized raster images.",
+        port_index=0,
+        column_filter=knut.is_binary,
+    )
+
+    name_col = knext.ColumnParameter(
+        "Layer name column",
+        "Select the column with the name of each layer. If none is selected the row IDs are used.",
+        port_index=0,
+        column_filter=knut.is_int_or_string,
+        include_none_column=True,
+    )
+
+    opacity_col = knext.ColumnParameter(
+        "Opacity column",
+        """Select the column with the opacity (0-1) of each layer. 
+        If none is selected or the value is missing the default opacity is used.""",
+        port_index=0,
+        column_filter=knut.is_numeric,
+        include_none_column=True,
+    )
+
+    band_selection = knext.StringParameter(
+        "Band(s) for visualization",
+        """Select one or 3 bands for visualization (e.g., "1" for grayscale, "2,3,4" for RGB). 
+        Band indices start from 1.""",
+        default_value="1",
+    )
+
+    color_map = knext.StringParameter(
+        "Color map",
+        "Select the color map for visualization.",
+        default_value="viridis",
+        enum=vut.COLOR_MAPS,
+    )
+
+    opacity = knext.DoubleParameter(
+        "Opacity",
+        """Set the default opacity of the layers. 
+        The value should be between 0 (completely transparent) and 1 (completely opaque).""",
+        default_value=0.7,
+        min_value=0.0,
+        max_value=1.0
+    )
+
+    base_map = knext.StringParameter(
+        "Base map",
+        """Select the base map to use for the visualization. 
+        See [Folium base maps](https://python-visualization.github.io/folium/quickstart.html#Tiles).""",
+        default_value="OpenStreetMap",
+        enum=vut.BASE_MAPS,
+    )
+
+    stretch = knext.StringParameter(
+        "Contrast stretch",
+        """Select which values of each band are mapped to the lowest and highest color:
+
+        - **min-max**: The minimum and maximum of the band.
+        - **percentile**: The lower and upper percentile of a regular sample of the pixels, which keeps a few 
+        extreme values from washing out the colors.""",
+        default_value="min-max",
+        enum=vut.STRETCH_METHODS,
+    )
+
+    lower_percent = knext.DoubleParameter(
+        "Lower percentile",
+        "The percentile (0-100) that is mapped to the lowest color of the percentile stretch.",
+        default_value=2.0,
+        min_value=0.0,
+        max_value=100.0,
+    )
+
+    upper_percent = knext.DoubleParameter(
+        "Upper percentile",
+        "The percentile (0-100) that is mapped to the highest color of the percentile stretch.",
+        default_value=98.0,
+        min_value=0.0,
+        max_value=100.0,
+    )
+
+    shared_stretch = knext.BoolParameter(
+        "Same colors for all layers",
+        """If checked, all layers are stretched between the lowest and highest value of all layers, so equal 
+        values have the same color in every layer, which allows to compare e.g. several dates. 
+        Otherwise each layer is stretched on its own.""",
+        default_value=True,
+    )
+
+    max_pixels = knext.IntParameter(
+        "Maximum display pixels per layer",
+        """The maximum number of pixels of each displayed layer. Larger rasters are reduced by an integer 
+        factor before they are colorized, which bounds the size of the view and the time to create it. 
+        Use 0 to display all pixels.""",
+        default_value=1000000,
+        min_value=0,
+    )
+
+    downsampling = knext.StringParameter(
+        "Downsampling method",
+        """Select how larger rasters are reduced to the display size:
+
+        - **average**: The mean of the valid pixels of each block.
+        - **decimate**: Every n-th pixel, which is faster and keeps the original values e.g. of classes.""",
+        default_value="average",
+        enum=vut.DOWNSAMPLING_METHODS,
+    )
+
+    num_threads = knext.IntParameter(
+        "Number of threads",
+        """The number of threads used to prepare the layers in parallel. 
+        Use 0 to use all available cores.""",
+        default_value=0,
+        min_value=0,
+    )
+
+    compression = knext.IntParameter(
+        "PNG compression level",
+        """The zlib compression level (0-9) of the rendered PNG images. 
+        Lower levels are faster, higher levels create smaller views.""",
+        default_value=6,
+        min_value=0,
+        max_value=9,
+    )
+
+    def configure(self, configure_context, input_schema):
+        self.raster_col = knut.column_exists_or_preset(configure_context, self.raster_col, input_schema, knut.is_binary)
+        if self.stretch == "percentile" and self.lower_percent >= self.upper_percent:
+            raise knext.InvalidParametersError("The lower percentile must be smaller than the upper percentile.")
+        return None
+
+    def execute(self, exec_context, input_table):
+        exec_context.set_progress(0.1, "Loading raster layers...")
+
+        import folium
+        import numpy as np
+        import util.tiling as tiling
+
+        df = input_table.to_pandas()
+        df = df[df[self.raster_col].notna()]
+        if len(df) == 0:
+            raise ValueError("The input table contains no raster images.")
+
+        # the none selection of optional columns is either None or the none column name
+        names = (
+            df[self.name_col].astype(str).tolist()
+            if self.name_col in df.columns else [str(row_id) for row_id in df.index]
+        )
+        opacities = [self.opacity] * len(df)
+        if self.opacity_col in df.columns:
+            opacities = [
+                self.opacity if np.isnan(value) else min(max(float(value), 0.0), 1.0)
+                for value in df[self.opacity_col].astype(float)
+            ]
+        bands = [int(band) - 1 for band in self.band_selection.split(',')]
+        if len(bands) not in (1, 3):
+            raise ValueError("Only 1-band or 3-band visualizations are supported.")
+
+        def prepare_layer(index):
+            # downsampled, stretched and warped to Web Mercator, each layer uses a single thread since the
+            # layers are processed in parallel
+            payload = df[self.raster_col].iloc[index]
+            img, profile, _, mask, extras = rut.load_raster(payload, with_extras=True)
+            if max(bands) >= img.shape[0] or min(bands) < 0:
+                raise ValueError(f"The raster of layer '{names[index]}' has only {img.shape[0]} band(s).")
+            factor = vut.display_factor(img.shape[1], img.shape[2], self.max_pixels)
+            display = vut.downsample(img, bands, factor, self.downsampling, profile.get("nodata"), mask, 1)
+            vmin, vmax = vut.stretch_range(
+                img, bands, self.stretch, self.lower_percent, self.upper_percent, profile.get("nodata"), mask,
+                extras.get("stats"), vut.payload_key(payload), display,
+            )
+            display, layer_bounds = vut.warp_to_mercator(
+                display, vut.display_transform(profile['transform'], factor), profile['crs'], 1
+            )
+            return display.astype(np.float32), layer_bounds, vmin, vmax
+
+        layers = tiling.run_tiles(
+            prepare_layer,
+            list(range(len(df))),
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            progress_start=0.1,
+            progress_end=0.6,
+            message="Prepared layer",
+        )
+
+        if self.shared_stretch:
+            # the per band ranges of all layers are arranged as (bands, layers, 1) arrays
+            vmin, _ = vut.band_range(np.array([layer[2] for layer in layers]).T[:, :, np.newaxis])
+            _, vmax = vut.band_range(np.array([layer[3] for layer in layers]).T[:, :, np.newaxis])
+            layers = [(display, layer_bounds, vmin, vmax) for display, layer_bounds, _, _ in layers]
+
+        def render_layer(layer):
+            display, _, layer_vmin, layer_vmax = layer
+            return vut.png_data_url(
+                vut.encode_png(vut.colorize(display, layer_vmin, layer_vmax, self.color_map), self.compression)
+            )
+
+        images = tiling.run_tiles(
+            render_layer,
+            layers,
+            exec_context=exec_context,
+            num_threads=self.num_threads,
+            progress_start=0.6,
+            progress_end=0.9,
+            message="Rendered layer",
+        )
+
+        # one overlay per raster that can be toggled in the layer control
+        west = min(layer[1][0] for layer in layers)
+        south = min(layer[1][1] for layer in layers)
+        east = max(layer[1][2] for layer in layers)
+        north = max(layer[1][3] for layer in layers)
+        m = folium.Map(location=[(south + north) / 2, (west + east) / 2], tiles=self.base_map)
+        m.fit_bounds([[south, west], [north, east]])
+        for name, opacity, (_, (left, bottom, right, top), _, _), image in zip(names, opacities, layers, images):
+            folium.raster_layers.ImageOverlay(
+                image,
+                bounds=[[bottom, left], [top, right]],
+                opacity=opacity,
+                name=name,
+            ).add_to(m)
+
+        folium.LayerControl(collapsed=False).add_to(m)
+
+        # HTML for KNIME view
+        html = m.get_root().render()
+        return knext.view(html)
@@ -0,0 +1,141 @@
+import logging
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+
+############################################
+# Mini-batch k-means
+############################################
+
+
+def valid_pixels(chunk: np.ndarray, nodata=None, mask: np.ndarray = None) -> np.ndarray:
+    """
+    Returns the (rows, cols) mask of the (bands, rows, cols) chunk whose values are valid in all bands and
+    that the validity mask does not mark as invalid.
+    """
+    valid = np.ones(chunk.shape[1:], dtype=bool) if mask is None else mask.copy()
+    if np.issubdtype(chunk.dtype, np.floating):
+        valid &= ~np.isnan(chunk).any(axis=0)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= ~(chunk == nodata).any(axis=0)
+    return valid
+
+
+def sample_pixels(
+    im_data: np.ndarray,
+    sample_size: int,
+    nodata=None,
+    seed: int = None,
+    mask: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Draws a random sample of valid pixels from the (bands, height, width) array.
+    @return: float64 array of shape (samples, bands)
+    """
+    rng = np.random.default_rng(seed)
+    bands, height, width = im_data.shape
+    flat = im_data.reshape(bands, -1)
+    # oversample to compensate for nodata pixels and fall back to sampling from all valid pixels
+    index = rng.choice(height * width, min(2 * sample_size, height * width), False)
+    index = np.sort(index)
+    pixels = flat[:, index]
+    sample_mask = None if mask is None else mask.ravel()[index][np.newaxis, :]
+    pixels = pixels[:, valid_pixels(pixels[:, np.newaxis, :], nodata, sample_mask)[0]]
+    if pixels.shape[1] < sample_size and len(index) < height * width:
+        valid = valid_pixels(im_data, nodata, mask).ravel()
+        candidates = np.flatnonzero(valid)
+        index = rng.choice(candidates, min(sample_size, len(candidates)), False)
+        pixels = flat[:, np.sort(index)]
+    return pixels[:, :sample_size].T.astype(np.float64)
+
+
+def squared_distances(pixels: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """
+    Returns the squared euclidean distances between the (n, bands) pixels and the (k, bands) centers computed
+    as |x|^2 - 2 x.c + |c|^2 with a single matrix multiplication. The expansion cancels for pixels close to a
+    center, so the result is clamped at zero to keep it usable as sampling weights.
+    """
+    distances = pixels @ (-2.0 * centers.T)
+    distances += np.einsum("ij,ij->i", pixels, pixels)[:, np.newaxis]
+    distances += np.einsum("ij,ij->i", centers, centers)[np.newaxis, :]
+    np.maximum(distances, 0, out=distances)
+    return distances
+
+
+def _init_centers(pixels: np.ndarray, k: int, rng) -> np.ndarray:
+    """
+    Selects the initial centers with the k-means++ strategy.
+    """
+    centers = [pixels[rng.integers(len(pixels))]]
+    closest = squared_distances(pixels, np.array(centers))[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        if total <= 0:
+            # fewer distinct pixels than clusters
+            centers.append(pixels[rng.integers(len(pixels))])
+            continue
+        center = pixels[rng.choice(len(pixels), p=closest / total)]
+        centers.append(center)
+        np.minimum(
+            closest, squared_distances(pixels, center[np.newaxis, :])[:, 0], out=closest
+        )
+    return np.array(centers)
+
+
+def fit_kmeans(
+    pixels: np.ndarray,
+    k: int,
+    batch_size: int = 1024,
+    max_iter: int = 100,
+    tolerance: float = 1e-4,
+    seed: int = None,
+) -> np.ndarray:
+    """
+    Fits k cluster centers to the (n, bands) pixels with mini-batch k-means (Sculley 2010). Each iteration
+    assigns a random batch to its closest centers and moves the centers towards the mean of their batch pixels
+    with a per-center learning rate of 1 / number of assigned pixels. The fit stops once the centers move less
+    than tolerance times the mean variance of the bands.
+    @return: (k, bands) array with the cluster centers
+    """
+    if len(pixels) == 0:
+        raise ValueError("The raster contains no valid pixels")
+    rng = np.random.default_rng(seed)
+    centers = _init_centers(pixels, k, rng)
+    counts = np.zeros(k)
+    threshold = tolerance * pixels.var(axis=0).mean()
+    for _ in range(max_iter):
+        batch = pixels[rng.integers(len(pixels), size=min(batch_size, len(pixels)))]
+        labels = squared_distances(batch, centers).argmin(axis=1)
+        batch_counts = np.bincount(labels, minlength=k)
+        batch_sums = np.zeros_like(centers)
+        np.add.at(batch_sums, labels, batch)
+        counts += batch_counts
+        updated = batch_counts > 0
+        rate = batch_counts[updated] / counts[updated]
+        new_centers = centers.copy()
+        new_centers[updated] += rate[:, np.newaxis] * (
+            batch_sums[updated] / batch_counts[updated][:, np.newaxis]
+            - centers[updated]
+        )
+        shift = np.square(new_centers - centers).sum(axis=1).max()
+        centers = new_centers
+        if shift <= threshold:
+            break
+    # order the clusters by the brightness of their centers to get reproducible class numbers
+    return centers[np.argsort(centers.sum(axis=1), kind="stable")]
+
+
+def assign_clusters(
+    chunk: np.ndarray, centers: np.ndarray, nodata=None, mask: np.ndarray = None
+) -> np.ndarray:
+    """
+    Assigns every pixel of the (bands, rows, cols) chunk to its closest center.
+    @return: uint8 array of shape (rows, cols) with the 1-based cluster number and 0 for invalid pixels
+    """
+    bands, rows, cols = chunk.shape
+    pixels = chunk.reshape(bands, -1).T.astype(np.float64)
+    labels = squared_distances(pixels, centers).argmin(axis=1).astype(np.uint8) + 1
+    labels[~valid_pixels(chunk, nodata, mask).ravel()] = 0
+    return labels.reshape(rows, cols)
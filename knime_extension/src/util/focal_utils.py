@@ -0,0 +1,318 @@
+import logging
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+LOGGER = logging.getLogger(__name__)
+
+FOCAL_FILTERS = ["mean", "gaussian", "median", "min", "max", "sobel", "custom"]
+"""Names of the supported focal filters."""
+
+# kernels with more taps are convolved via FFT instead of direct summation
+__MAX_DIRECT_TAPS = 49
+# 1-D kernels longer than this are convolved via FFT instead of separable passes
+__MAX_SEPARABLE_LENGTH = 31
+# box filters larger than this use a summed-area table instead of separable passes
+__MAX_BOX_PASS_SIZE = 7
+# maximum number of window values the median copies at once, which bounds its memory to 32 MB per call
+__MEDIAN_BLOCK_VALUES = 4 * 1024 * 1024
+
+
+############################################
+# Kernel helper
+############################################
+
+
+def gaussian_kernel(sigma: float) -> np.ndarray:
+    """
+    Returns the normalized 1-D Gaussian kernel with a radius of three standard deviations.
+    """
+    radius = max(int(np.ceil(3 * sigma)), 1)
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def parse_kernel(kernel: str) -> np.ndarray:
+    """
+    Parses a kernel string where rows are separated by semicolons and values by commas e.g. "1,2,1;2,4,2;1,2,1".
+    The kernel needs an odd number of rows and columns.
+    @return: 2-D float64 kernel
+    """
+    try:
+        rows = [
+            [float(value) for value in row.split(",")]
+            for row in kernel.strip().split(";")
+            if row.strip()
+        ]
+    except (AttributeError, ValueError):
+        raise ValueError(
+            f"'{kernel}' is not a valid kernel. Enter numbers separated by commas and rows separated by semicolons."
+        )
+    if not rows or any(len(row) != len(rows[0]) for row in rows):
+        raise ValueError("All kernel rows need the same number of values")
+    result = np.array(rows, dtype=np.float64)
+    if result.shape[0] % 2 == 0 or result.shape[1] % 2 == 0:
+        raise ValueError("The kernel needs an odd number of rows and columns")
+    return result
+
+
+def kernel_radius(
+    filter_type: str, size: int = 3, sigma: float = 1.0, kernel: np.ndarray = None
+):
+    """
+    Returns the (row, col) radius of the neighbourhood of the given filter which is the halo that
+    tiles need to be extended by.
+    """
+    if filter_type == "gaussian":
+        radius = len(gaussian_kernel(sigma)) // 2
+        return radius, radius
+    if filter_type == "sobel":
+        return 1, 1
+    if filter_type == "custom":
+        return kernel.shape[0] // 2, kernel.shape[1] // 2
+    return size // 2, size // 2
+
+
+############################################
+# Valid mode correlation backends
+############################################
+# All backends take an array that is padded by the kernel radius and return the "valid" part which has
+# the shape of the unpadded array.
+
+
+def _correlate_direct(padded: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """
+    Sums the shifted arrays weighted by the kernel taps which is fast for small kernels.
+    """
+    height = padded.shape[0] - kernel.shape[0] + 1
+    width = padded.shape[1] - kernel.shape[1] + 1
+    result = np.zeros((height, width), dtype=np.float64)
+    for (i, j), weight in np.ndenumerate(kernel):
+        if weight != 0:
+            result += weight * padded[i : i + height, j : j + width]
+    return result
+
+
+def _correlate_fft(padded: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """
+    Correlates via the FFT whose cost does not depend on the kernel size.
+    """
+    shape = padded.shape
+    spectrum = np.fft.rfft2(padded, shape) * np.fft.rfft2(kernel[::-1, ::-1], shape)
+    full = np.fft.irfft2(spectrum, shape)
+    return full[kernel.shape[0] - 1 :, kernel.shape[1] - 1 :]
+
+
+def _correlate_separable(
+    padded: np.ndarray, row_kernel: np.ndarray, col_kernel: np.ndarray
+) -> np.ndarray:
+    """
+    Applies the separable kernel outer(row_kernel, col_kernel) as two 1-D passes.
+    """
+    if max(len(row_kernel), len(col_kernel)) > __MAX_SEPARABLE_LENGTH:
+        return _correlate_fft(padded, np.outer(row_kernel, col_kernel))
+    return _correlate_direct(
+        _correlate_direct(padded, row_kernel[:, np.newaxis]),
+        col_kernel[np.newaxis, :],
+    )
+
+
+def _box_sum(padded: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """
+    Returns the sum over all rows x cols windows. Small windows use separable passes, larger windows
+    a summed-area table whose cost does not depend on the window size.
+    """
+    if max(rows, cols) <= __MAX_BOX_PASS_SIZE:
+        return _correlate_separable(padded, np.ones(rows), np.ones(cols))
+    table = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.float64)
+    np.cumsum(padded, axis=0, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return (
+        table[rows:, cols:]
+        - table[:-rows, cols:]
+        - table[rows:, :-cols]
+        + table[:-rows, :-cols]
+    )
+
+
+def correlate(padded: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """
+    Correlates the padded array with the kernel choosing the backend based on the kernel: rank one kernels
+    are applied as separable 1-D passes, small kernels by direct summation and large kernels via FFT.
+    """
+    if kernel.shape[0] > 1 and kernel.shape[1] > 1:
+        u, s, vt = np.linalg.svd(kernel)
+        if s[1:].max() <= 1e-10 * s[0]:
+            return _correlate_separable(padded, u[:, 0] * s[0], vt[0])
+    if kernel.size <= __MAX_DIRECT_TAPS:
+        return _correlate_direct(padded, kernel)
+    return _correlate_fft(padded, kernel)
+
+
+############################################
+# Focal filter
+############################################
+
+
+def focal_filter(
+    padded: np.ndarray,
+    filter_type: str,
+    size: int = 3,
+    sigma: float = 1.0,
+    kernel: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Applies the focal filter to the 2-D float array which is padded by the kernel radius of the filter and
+    where invalid pixels are NaN. Mean and Gaussian filters ignore invalid pixels by normalizing with the
+    weights of the valid pixels, min, max and median ignore them as well. Sobel and custom kernels are NaN
+    wherever an invalid pixel falls into the kernel. Pixels that are invalid themselves stay NaN.
+    @return: float64 array with the shape of the unpadded array
+    """
+    row_radius, col_radius = kernel_radius(filter_type, size, sigma, kernel)
+    invalid = np.isnan(padded)
+    has_invalid = invalid.any()
+    values = np.where(invalid, 0.0, padded) if has_invalid else padded
+    center = invalid[
+        row_radius : padded.shape[0] - row_radius,
+        col_radius : padded.shape[1] - col_radius,
+    ]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if filter_type == "mean":
+            result = _box_sum(values, size, size)
+            if has_invalid:
+                result /= _box_sum((~invalid).astype(np.float64), size, size)
+            else:
+                result /= size * size
+        elif filter_type == "gaussian":
+            weights_1d = gaussian_kernel(sigma)
+            result = _correlate_separable(values, weights_1d, weights_1d)
+            if has_invalid:
+                result /= _correlate_separable(
+                    (~invalid).astype(np.float64), weights_1d, weights_1d
+                )
+        elif filter_type in ("min", "max"):
+            fill = np.inf if filter_type == "min" else -np.inf
+            reduce = np.min if filter_type == "min" else np.max
+            data = np.where(invalid, fill, padded) if has_invalid else padded
+            # min and max are separable
+            result = reduce(sliding_window_view(data, size, axis=0), axis=-1)
+            result = reduce(sliding_window_view(result, size, axis=1), axis=-1)
+            result[np.isinf(result)] = np.nan
+        elif filter_type == "median":
+            windows = sliding_window_view(padded, (size, size))
+            reduce = np.nanmedian if has_invalid else np.median
+            # the median copies every window, so it is computed in blocks of bounded size
+            height, width = windows.shape[:2]
+            cols = min(max(__MEDIAN_BLOCK_VALUES // (size * size), 1), width)
+            rows = max(__MEDIAN_BLOCK_VALUES // (cols * size * size), 1)
+            result = np.empty((height, width))
+            for row in range(0, height, rows):
+                for col in range(0, width, cols):
+                    result[row : row + rows, col : col + cols] = reduce(
+                        windows[row : row + rows, col : col + cols], axis=(-2, -1)
+                    )
+        elif filter_type in ("sobel", "custom"):
+            if filter_type == "sobel":
+                smooth = np.array([1.0, 2.0, 1.0])
+                derivative = np.array([-1.0, 0.0, 1.0])
+                gx = _correlate_separable(values, smooth, derivative)
+                gy = _correlate_separable(values, derivative, smooth)
+                result = np.hypot(gx, gy)
+                footprint = (3, 3)
+            else:
+                result = correlate(values, kernel)
+                footprint = kernel.shape
+            if has_invalid:
+                touched = _box_sum(invalid.astype(np.float64), *footprint)
+                result[touched > 0.5] = np.nan
+        else:
+            raise ValueError(f"Unsupported filter: {filter_type}")
+
+    if has_invalid:
+        result[center] = np.nan
+    return result
+
+
+############################################
+# Terrain
+############################################
+
+TERRAIN_PRODUCTS = ["slope", "aspect", "hillshade", "curvature"]
+"""Names of the supported terrain products."""
+
+
+def terrain(
+    padded: np.ndarray,
+    x_size: np.ndarray,
+    y_size: np.ndarray,
+    products: list,
+    z_factor: float = 1.0,
+    azimuth: float = 315.0,
+    altitude: float = 45.0,
+) -> np.ndarray:
+    """
+    Computes the terrain products of the 2-D float elevation array which is padded by one pixel and where
+    invalid pixels are NaN. x_size and y_size are the pixel sizes in elevation units per row of the unpadded
+    array. Slope and aspect use the 3x3 finite differences of Horn (1981), the curvature the second
+    derivatives of Zevenbergen and Thorne (1987). Slope and aspect are given in degrees with the aspect
+    clockwise from north and -1 for flat pixels, hillshade between 0 and 255 and the curvature in 1/100 units
+    with positive values for upwardly convex surfaces. Pixels with an invalid neighbour are NaN.
+    @return: float32 array of shape (len(products), rows, cols)
+    """
+    rows, cols = padded.shape[0] - 2, padded.shape[1] - 2
+    z = padded * z_factor
+
+    def shifted(row: int, col: int) -> np.ndarray:
+        return z[row : row + rows, col : col + cols]
+
+    x_size = np.asarray(x_size, dtype=np.float64).reshape(-1, 1)
+    y_size = np.asarray(y_size, dtype=np.float64).reshape(-1, 1)
+    result = np.empty((len(products), rows, cols), dtype=np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if {"slope", "aspect", "hillshade"} & set(products):
+            # gradient towards east and north, rows run from north to south
+            east = (
+                shifted(0, 2)
+                + 2 * shifted(1, 2)
+                + shifted(2, 2)
+                - shifted(0, 0)
+                - 2 * shifted(1, 0)
+                - shifted(2, 0)
+            ) / (8 * x_size)
+            north = (
+                shifted(0, 0)
+                + 2 * shifted(0, 1)
+                + shifted(0, 2)
+                - shifted(2, 0)
+                - 2 * shifted(2, 1)
+                - shifted(2, 2)
+            ) / (8 * y_size)
+            slope = np.arctan(np.hypot(east, north))
+            # the aspect is the compass direction of the steepest descent
+            aspect = np.degrees(np.arctan2(-east, -north)) % 360
+        for target, product in zip(result, products):
+            if product == "slope":
+                target[:] = np.degrees(slope)
+            elif product == "aspect":
+                target[:] = np.where((east == 0) & (north == 0), -1.0, aspect)
+            elif product == "hillshade":
+                zenith = np.radians(90.0 - altitude)
+                shade = np.cos(zenith) * np.cos(slope) + np.sin(zenith) * np.sin(
+                    slope
+                ) * np.cos(np.radians(azimuth - aspect))
+                target[:] = 255.0 * np.maximum(shade, 0.0)
+            elif product == "curvature":
+                center = shifted(1, 1)
+                d = ((shifted(1, 0) + shifted(1, 2)) / 2 - center) / x_size**2
+                e = ((shifted(0, 1) + shifted(2, 1)) / 2 - center) / y_size**2
+                target[:] = -200.0 * (d + e)
+            else:
+                raise ValueError(f"Unsupported terrain product: {product}")
+    # propagate invalid neighbours which the arithmetic does not cover for all products e.g. flat aspect
+    invalid = np.isnan(padded)
+    if invalid.any():
+        touched = _box_sum(invalid.astype(np.float64), 3, 3) > 0.5
+        result[:, touched] = np.nan
+    return result
@@ -0,0 +1,1347 @@
+import ast
+import logging
+import os
+import pickle
+import re
+import warnings
+from typing import List
+from typing import Tuple
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+
+############################################
+# Parallel execution helper
+############################################
+
+
+def get_worker_count(num_threads: int = 0) -> int:
+    """
+    Returns the number of workers to use for parallel processing. Values smaller than 1 select all
+    available cores.
+    """
+    if num_threads is None or num_threads < 1:
+        return os.cpu_count() or 1
+    return num_threads
+
+
+############################################
+# Raster payload helper
+############################################
+# The raster port holds the pickled list [im_data, profile, bounds] with an optional fourth element, a dict
+# with extra information. Its "mask" entry is the bitpacked (height, width) validity mask of the raster
+# where set bits mark valid pixels. Pixels are invalid if the mask marks them as invalid or if their value is
+# NaN or the nodata value of the profile. Payloads without mask are valid wherever the nodata value says so.
+# The optional "stats" entry maps 0-based band indices to known statistics of the band such as "min", "max"
+# and "percentiles", a dict from percentage to value, which saves consumers a pass over the pixels. The
+# optional "band_names" entry lists the names of the bands e.g. of the inputs of an aligned stack.
+
+
+def load_raster(data: bytes, with_extras: bool = False):
+    """
+    Deserializes the raster port data.
+    @return: im_data, profile, bounds and the boolean (height, width) validity mask or None if the payload has
+    no mask, followed by the dict with the remaining extras if with_extras is set
+    """
+    payload = pickle.loads(data)
+    im_data, profile, bounds = payload[:3]
+    extras = payload[3] if len(payload) > 3 and payload[3] else {}
+    mask = None
+    if extras.get("mask") is not None:
+        height, width = im_data.shape[-2:]
+        mask = (
+            np.unpackbits(extras["mask"], count=height * width)
+            .reshape(height, width)
+            .view(bool)
+        )
+    if with_extras:
+        return (
+            im_data,
+            profile,
+            bounds,
+            mask,
+            {k: v for k, v in extras.items() if k != "mask"},
+        )
+    return im_data, profile, bounds, mask
+
+
+def dump_raster(
+    im_data: np.ndarray, profile, bounds, mask: np.ndarray = None, extras: dict = None
+) -> bytes:
+    """
+    Serializes the raster for the raster port. The validity mask is only stored if it marks any pixel as
+    invalid, in which case it is bitpacked to an eighth of the size of a boolean array. Extras such as
+    statistics are only valid for unchanged pixel values and must not be passed on by nodes that modify them.
+    """
+    payload = [im_data, profile, bounds]
+    extras = dict(extras) if extras else {}
+    if mask is not None and not mask.all():
+        extras["mask"] = np.packbits(mask, axis=None)
+    if extras:
+        payload.append(extras)
+    return pickle.dumps(payload)
+
+
+def invalid_mask(chunk: np.ndarray, nodata=None, mask: np.ndarray = None) -> np.ndarray:
+    """
+    Returns the mask of the pixels of the chunk that are NaN, equal to the nodata value or marked as invalid by
+    the validity mask which is broadcast over the bands.
+    """
+    invalid = (
+        np.isnan(chunk)
+        if np.issubdtype(chunk.dtype, np.floating)
+        else np.zeros(chunk.shape, dtype=bool)
+    )
+    if nodata is not None and not np.isnan(nodata):
+        invalid |= chunk == nodata
+    if mask is not None:
+        invalid |= ~mask
+    return invalid
+
+
+def valid_mask(im_data: np.ndarray, nodata=None, mask: np.ndarray = None) -> np.ndarray:
+    """
+    Returns the (height, width) mask of the pixels that are valid in all bands.
+    """
+    return (
+        ~invalid_mask(im_data, nodata, mask)
+        .reshape(-1, *im_data.shape[-2:])
+        .any(axis=0)
+    )
+
+
+def default_nodata(dtype):
+    """
+    Returns the nodata value that is used for rasters of the given data type without nodata value, which is
+    NaN for floating point rasters and the largest respectively smallest value of unsigned and signed integers.
+    """
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.floating):
+        return np.nan
+    info = np.iinfo(dtype)
+    return int(info.max) if dtype.kind == "u" else int(info.min)
+
+
+def mask_to_nodata(im_data: np.ndarray, nodata=None, mask: np.ndarray = None):
+    """
+    Writes the nodata value into the pixels that the validity mask marks as invalid, for operations such as
+    warping that only know about nodata values. Rasters without nodata value get the default_nodata.
+    @return: the array which is a copy if the mask marks any pixel as invalid, and its nodata value
+    """
+    if mask is None or mask.all():
+        return im_data, nodata
+    if nodata is None:
+        nodata = default_nodata(im_data.dtype)
+    filled = im_data.copy()
+    filled[..., ~mask] = nodata
+    return filled, nodata
+
+
+############################################
+# Transform helper
+############################################
+
+
+def bounds_from_transform(transform, width: int, height: int) -> List[float]:
+    """
+    Returns the bounds of a raster with the given affine transform and shape.
+    @return: [left, bottom, right, top] as used in the raster payload
+    """
+    left, top = transform * (0, 0)
+    right, bottom = transform * (width, height)
+    return [left, bottom, right, top]
+
+
+def bounds_window(
+    transform, bounds, height: int, width: int, pad: int = 0
+) -> Tuple[int, int, int, int]:
+    """
+    Computes the pixel window that covers the given (left, bottom, right, top) bounds. The window is rounded
+    outwards to whole pixels, extended by pad pixels on each side and intersected with the raster extent.
+    @return: (row_start, row_stop, col_start, col_stop) or None if the bounds do not overlap the raster
+    """
+    minx, miny, maxx, maxy = bounds
+
+    # transform all four corners to support rotated and south-up rasters
+    inverse = ~transform
+    cols, rows = zip(
+        *[
+            inverse * (x, y)
+            for x, y in ((minx, miny), (minx, maxy), (maxx, miny), (maxx, maxy))
+        ]
+    )
+    row_start = max(int(np.floor(min(rows))) - pad, 0)
+    row_stop = min(int(np.ceil(max(rows))) + pad, height)
+    col_start = max(int(np.floor(min(cols))) - pad, 0)
+    col_stop = min(int(np.ceil(max(cols))) + pad, width)
+    if row_start >= row_stop or col_start >= col_stop:
+        return None
+    return row_start, row_stop, col_start, col_stop
+
+
+def geometry_window(
+    transform, geometries, height: int, width: int
+) -> Tuple[int, int, int, int]:
+    """
+    Computes the pixel window that covers the bounds of the given geometries.
+    @return: (row_start, row_stop, col_start, col_stop) or None if the geometries do not overlap the raster
+    """
+    bounds = np.array(
+        [g.bounds for g in geometries if g is not None and not g.is_empty]
+    )
+    if bounds.size == 0:
+        return None
+    return bounds_window(
+        transform,
+        (
+            bounds[:, 0].min(),
+            bounds[:, 1].min(),
+            bounds[:, 2].max(),
+            bounds[:, 3].max(),
+        ),
+        height,
+        width,
+    )
+
+
+def block_windows(
+    height: int, width: int, block_size: int
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Splits a raster of the given shape into square blocks of at most block_size pixels per side.
+    @return: list of (row_start, row_stop, col_start, col_stop) windows
+    """
+    if block_size is None or block_size < 1:
+        return [(0, height, 0, width)]
+    return [
+        (row, min(row + block_size, height), col, min(col + block_size, width))
+        for row in range(0, height, block_size)
+        for col in range(0, width, block_size)
+    ]
+
+
+def pixel_size_meters(
+    transform, crs, rows: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the width and height of the pixels in the given rows in meters. For geographic CRSs the pixel
+    size in degrees is converted with the length of a degree on the WGS84 ellipsoid at the latitude of
+    the pixel center of each row, which is why the result is given per row.
+    @return: (x size, y size) arrays with one value per row
+    """
+    rows = np.asarray(rows, dtype=np.float64)
+    x_size = np.full(rows.shape, abs(transform.a))
+    y_size = np.full(rows.shape, abs(transform.e))
+    if crs is not None and crs.is_geographic:
+        latitude = np.radians(transform.f + (rows + 0.5) * transform.e)
+        x_size *= 111412.84 * np.cos(latitude) - 93.5 * np.cos(3 * latitude)
+        y_size *= (
+            111132.92 - 559.82 * np.cos(2 * latitude) + 1.175 * np.cos(4 * latitude)
+        )
+    elif crs is not None:
+        try:
+            factor = crs.linear_units_factor[1]
+        except Exception:
+            factor = 1.0
+        x_size *= factor
+        y_size *= factor
+    return x_size, y_size
+
+
+############################################
+# Clip helper
+############################################
+
+
+def clip_array(
+    im_data: np.ndarray,
+    transform,
+    geometries,
+    crop: bool = True,
+    nodata=None,
+    all_touched: bool = False,
+    num_threads: int = 1,
+    tile_size: int = 1024,
+    mask: np.ndarray = None,
+):
+    """
+    Masks the (bands, height, width) array with the given geometries which need to be in the raster CRS.
+    Only the pixel window that covers the geometries is sliced and rasterized, so the cost depends on the
+    clipped area and not on the size of the source raster. The window is processed in tiles that are
+    rasterized in parallel. Pixels outside the geometries are set to nodata or 0 if no nodata value is
+    defined, which mirrors rasterio.mask.mask, and are marked as invalid in the returned validity mask which
+    also keeps the invalid pixels of the given mask.
+    @return: the clipped array, its affine transform and its validity mask
+    """
+    from rasterio.features import geometry_mask
+    from rasterio.windows import Window
+    from rasterio.windows import transform as window_transform
+    import util.tiling as tiling
+
+    geometries = [g for g in geometries if g is not None and not g.is_empty]
+    height, width = im_data.shape[-2:]
+    window = geometry_window(transform, geometries, height, width)
+    if window is None:
+        raise ValueError("Input shapes do not overlap raster.")
+    row_start, row_stop, col_start, col_stop = window
+
+    # slicing returns a view so the source data is not copied
+    view = im_data[..., row_start:row_stop, col_start:col_stop]
+    view_transform = window_transform(
+        Window(col_start, row_start, col_stop - col_start, row_stop - row_start),
+        transform,
+    )
+
+    fill_value = 0 if nodata is None else nodata
+    if crop:
+        clipped = np.empty_like(view)
+        target = clipped
+        valid = np.empty(view.shape[-2:], dtype=bool)
+        valid_target = valid
+    else:
+        clipped = np.full_like(im_data, fill_value)
+        target = clipped[..., row_start:row_stop, col_start:col_stop]
+        valid = np.zeros((height, width), dtype=bool)
+        valid_target = valid[row_start:row_stop, col_start:col_stop]
+
+    def clip_tile(tile):
+        tile_row_start, tile_row_stop, tile_col_start, tile_col_stop = tile
+        outside = geometry_mask(
+            geometries,
+            out_shape=(tile_row_stop - tile_row_start, tile_col_stop - tile_col_start),
+            transform=window_transform(
+                Window(
+                    tile_col_start,
+                    tile_row_start,
+                    tile_col_stop - tile_col_start,
+                    tile_row_stop - tile_row_start,
+                ),
+                view_transform,
+            ),
+            all_touched=all_touched,
+        )
+        source = view[..., tile_row_start:tile_row_stop, tile_col_start:tile_col_stop]
+        destination = target[
+            ..., tile_row_start:tile_row_stop, tile_col_start:tile_col_stop
+        ]
+        if crop:
+            destination[...] = source
+            destination[..., outside] = fill_value
+        else:
+            inside = ~outside
+            destination[..., inside] = source[..., inside]
+        tile_valid = ~outside
+        if mask is not None:
+            tile_valid &= mask[
+                row_start + tile_row_start : row_start + tile_row_stop,
+                col_start + tile_col_start : col_start + tile_col_stop,
+            ]
+        valid_target[tile_row_start:tile_row_stop, tile_col_start:tile_col_stop] = (
+            tile_valid
+        )
+
+    tiling.run_tiles(
+        clip_tile,
+        tiling.tile_windows(view.shape[-2], view.shape[-1], tile_size),
+        num_threads=num_threads,
+    )
+    return clipped, view_transform if crop else transform, valid
+
+
+############################################
+# Reprojection helper
+############################################
+
+RESAMPLING_METHODS = [
+    "nearest",
+    "bilinear",
+    "cubic",
+    "cubic_spline",
+    "lanczos",
+    "average",
+    "mode",
+    "max",
+    "min",
+    "med",
+    "q1",
+    "q3",
+    "sum",
+    "rms",
+]
+"""Names of the rasterio.enums.Resampling methods that can be selected in the node dialogs."""
+
+
+def reproject_array(
+    im_data: np.ndarray,
+    src_transform,
+    src_crs,
+    dst_crs,
+    resolution: float = None,
+    resampling: str = "nearest",
+    nodata=None,
+    num_threads: int = 0,
+    block_size: int = 1024,
+    exec_context=None,
+):
+    """
+    Reprojects the (bands, height, width) array to the given CRS with the default grid computed by GDAL
+    for the given resolution.
+    @return: the reprojected array and its affine transform
+    """
+    from rasterio.transform import array_bounds
+    from rasterio.warp import calculate_default_transform
+
+    height, width = im_data.shape[1:]
+    left, bottom, right, top = array_bounds(height, width, src_transform)
+    dst_transform, dst_width, dst_height = calculate_default_transform(
+        src_crs,
+        dst_crs,
+        width,
+        height,
+        left,
+        bottom,
+        right,
+        top,
+        resolution=resolution if resolution else None,
+    )
+    destination = warp_to_grid(
+        im_data,
+        src_transform,
+        src_crs,
+        dst_transform,
+        dst_crs,
+        dst_height,
+        dst_width,
+        resampling=resampling,
+        nodata=nodata,
+        num_threads=num_threads,
+        block_size=block_size,
+        exec_context=exec_context,
+    )
+    return destination, dst_transform
+
+
+def warp_to_grid(
+    im_data: np.ndarray,
+    src_transform,
+    src_crs,
+    dst_transform,
+    dst_crs,
+    dst_height: int,
+    dst_width: int,
+    resampling: str = "nearest",
+    nodata=None,
+    dst_nodata=None,
+    dst_dtype=None,
+    num_threads: int = 0,
+    block_size: int = 1024,
+    exec_context=None,
+    progress_start: float = 0.1,
+    progress_end: float = 0.9,
+) -> np.ndarray:
+    """
+    Warps the (bands, height, width) array onto the given destination grid. Destination pixels without
+    source data are set to dst_nodata which defaults to the source nodata or 0. If block_size is larger
+    than 0 the destination grid is split into blocks which are warped independently in a thread pool.
+    Each block only reads the source window that covers it, which bounds the memory GDAL needs per block.
+    Otherwise the whole destination is warped in a single multithreaded call.
+    @return: the warped array of shape (bands, dst_height, dst_width)
+    """
+    from rasterio.enums import Resampling
+    from rasterio.warp import reproject
+    from rasterio.warp import transform_bounds
+    from rasterio.windows import Window
+    from rasterio.windows import transform as window_transform
+    import util.tiling as tiling
+
+    bands, height, width = im_data.shape
+    if dst_nodata is None:
+        dst_nodata = nodata
+    fill_value = 0 if dst_nodata is None else dst_nodata
+    dtype = im_data.dtype if dst_dtype is None else np.dtype(dst_dtype)
+    destination = np.full((bands, dst_height, dst_width), fill_value, dtype)
+    method = Resampling[resampling]
+    workers = get_worker_count(num_threads)
+
+    def warp(window, source, source_transform, threads):
+        row_start, row_stop, col_start, col_stop = window
+        block = np.full(
+            (bands, row_stop - row_start, col_stop - col_start), fill_value, dtype
+        )
+        reproject(
+            source=np.ascontiguousarray(source),
+            destination=block,
+            src_transform=source_transform,
+            src_crs=src_crs,
+            src_nodata=nodata,
+            dst_transform=window_transform(
+                Window(
+                    col_start, row_start, col_stop - col_start, row_stop - row_start
+                ),
+                dst_transform,
+            ),
+            dst_crs=dst_crs,
+            dst_nodata=dst_nodata,
+            resampling=method,
+            num_threads=threads,
+        )
+        destination[:, row_start:row_stop, col_start:col_stop] = block
+
+    def warp_block(window):
+        row_start, row_stop, col_start, col_stop = window
+        block_bounds = bounds_from_transform(
+            window_transform(
+                Window(
+                    col_start, row_start, col_stop - col_start, row_stop - row_start
+                ),
+                dst_transform,
+            ),
+            col_stop - col_start,
+            row_stop - row_start,
+        )
+        src_bounds = transform_bounds(
+            dst_crs,
+            src_crs,
+            min(block_bounds[0], block_bounds[2]),
+            min(block_bounds[1], block_bounds[3]),
+            max(block_bounds[0], block_bounds[2]),
+            max(block_bounds[1], block_bounds[3]),
+            densify_pts=21,
+        )
+        src_window = bounds_window(src_transform, src_bounds, height, width)
+        if src_window is None:
+            # block lies outside of the source raster
+            return
+        # pad the source window by the resampling kernel and the scale between both grids
+        scale = max(
+            (src_window[1] - src_window[0]) / (row_stop - row_start),
+            (src_window[3] - src_window[2]) / (col_stop - col_start),
+        )
+        src_window = bounds_window(
+            src_transform, src_bounds, height, width, pad=3 + int(np.ceil(scale))
+        )
+        src_row_start, src_row_stop, src_col_start, src_col_stop = src_window
+        warp(
+            window,
+            im_data[:, src_row_start:src_row_stop, src_col_start:src_col_stop],
+            window_transform(
+                Window(
+                    src_col_start,
+                    src_row_start,
+                    src_col_stop - src_col_start,
+                    src_row_stop - src_row_start,
+                ),
+                src_transform,
+            ),
+            1,
+        )
+
+    windows = block_windows(dst_height, dst_width, block_size)
+    if len(windows) == 1:
+        warp(windows[0], im_data, src_transform, workers)
+        return destination
+
+    tiling.run_tiles(
+        warp_block,
+        windows,
+        exec_context=exec_context,
+        num_threads=workers,
+        progress_start=progress_start,
+        progress_end=progress_end,
+        message="Warped block",
+    )
+    return destination
+
+
+def coverage_mask(
+    height: int,
+    width: int,
+    src_transform,
+    src_crs,
+    dst_transform,
+    dst_crs,
+    dst_height: int,
+    dst_width: int,
+    num_threads: int = 0,
+    block_size: int = 1024,
+) -> np.ndarray:
+    """
+    Returns the validity mask of the destination grid that marks the pixels covered by the source raster,
+    which is needed for rasters without nodata value whose uncovered pixels are otherwise filled with 0.
+    """
+    coverage = warp_to_grid(
+        np.ones((1, height, width), dtype=np.uint8),
+        src_transform,
+        src_crs,
+        dst_transform,
+        dst_crs,
+        dst_height,
+        dst_width,
+        dst_nodata=0,
+        num_threads=num_threads,
+        block_size=block_size,
+    )
+    return coverage[0].view(bool)
+
+
+def common_grid(
+    profiles: List[dict], dst_crs, resolution: float = None, extent="intersection"
+):
+    """
+    Computes a north-up grid in the given CRS that covers the intersection or union of the given raster
+    profiles or the extent of the first profile. Without resolution the resolution of the first raster in
+    the destination CRS is used.
+    @return: the affine transform, height and width of the grid
+    """
+    from rasterio.transform import array_bounds
+    from rasterio.transform import from_origin
+    from rasterio.warp import calculate_default_transform
+    from rasterio.warp import transform_bounds
+
+    all_bounds = []
+    for profile in profiles:
+        left, bottom, right, top = array_bounds(
+            profile["height"], profile["width"], profile["transform"]
+        )
+        all_bounds.append(
+            transform_bounds(profile["crs"], dst_crs, left, bottom, right, top)
+        )
+    all_bounds = np.array(all_bounds)
+    if extent == "first":
+        left, bottom, right, top = all_bounds[0]
+    elif extent == "union":
+        left, bottom = all_bounds[:, :2].min(axis=0)
+        right, top = all_bounds[:, 2:].max(axis=0)
+    else:
+        left, bottom = all_bounds[:, :2].max(axis=0)
+        right, top = all_bounds[:, 2:].min(axis=0)
+    if left >= right or bottom >= top:
+        raise ValueError("The rasters do not overlap.")
+
+    if not resolution:
+        first = profiles[0]
+        default_transform, _, _ = calculate_default_transform(
+            first["crs"],
+            dst_crs,
+            first["width"],
+            first["height"],
+            *array_bounds(first["height"], first["width"], first["transform"]),
+        )
+        resolution = (abs(default_transform.a), abs(default_transform.e))
+    elif np.isscalar(resolution):
+        resolution = (resolution, resolution)
+    width = max(int(np.ceil((right - left) / resolution[0] - 1e-6)), 1)
+    height = max(int(np.ceil((top - bottom) / resolution[1] - 1e-6)), 1)
+    return from_origin(left, top, resolution[0], resolution[1]), height, width
+
+
+############################################
+# Block aggregation helper
+############################################
+
+AGGREGATION_METHODS = {
+    "mean": "average",
+    "sum": "sum",
+    "mode": "mode",
+    "min": "min",
+    "max": "max",
+}
+"""Supported block aggregations and their rasterio resampling counterpart for non-integer factors."""
+
+
+def _block_mode(blocks: np.ndarray) -> np.ndarray:
+    """
+    Returns the most frequent value along the last axis. NaNs are ignored and ties resolve to the smallest value.
+    """
+    values = np.sort(blocks, axis=-1)
+    positions = np.arange(values.shape[-1])
+    new_run = np.ones(values.shape, dtype=bool)
+    new_run[..., 1:] = values[..., 1:] != values[..., :-1]
+    run_start = np.maximum.accumulate(np.where(new_run, positions, 0), axis=-1)
+    run_length = positions - run_start + 1
+    # NaNs are sorted to the end and never form runs longer than one
+    run_length[np.isnan(values)] = 0
+    best = np.argmax(run_length, axis=-1)
+    return np.take_along_axis(values, best[..., np.newaxis], axis=-1)[..., 0]
+
+
+def aggregate_blocks(
+    chunk: np.ndarray, factor: int, method: str, nodata=None
+) -> np.ndarray:
+    """
+    Aggregates factor x factor pixel blocks of the (bands, height, width) chunk with the given method.
+    The chunk is padded with NaN to a multiple of the factor and reshaped into a
+    (bands, rows, factor, cols, factor) view which is reduced without Python loops. Nodata pixels are
+    ignored and blocks without valid pixels are NaN.
+    @return: float64 array of shape (bands, ceil(height / factor), ceil(width / factor))
+    """
+    bands, height, width = chunk.shape
+    rows = -(-height // factor)
+    cols = -(-width // factor)
+    padded = np.full((bands, rows * factor, cols * factor), np.nan)
+    padded[:, :height, :width] = chunk
+    if nodata is not None and not np.isnan(nodata):
+        padded[padded == nodata] = np.nan
+    blocks = padded.reshape(bands, rows, factor, cols, factor)
+
+    with warnings.catch_warnings():
+        # all-NaN blocks are expected for nodata areas
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if method == "mean":
+            return np.nanmean(blocks, axis=(2, 4))
+        if method == "min":
+            return np.nanmin(blocks, axis=(2, 4))
+        if method == "max":
+            return np.nanmax(blocks, axis=(2, 4))
+        if method == "sum":
+            result = np.nansum(blocks, axis=(2, 4))
+            result[np.isnan(blocks).all(axis=(2, 4))] = np.nan
+            return result
+        if method == "mode":
+            flat = blocks.transpose(0, 1, 3, 2, 4).reshape(
+                bands, rows, cols, factor * factor
+            )
+            return _block_mode(flat)
+    raise ValueError(f"Unsupported aggregation method: {method}")
+
+
+############################################
+# Band math helper
+############################################
+
+EXPRESSION_FUNCTIONS = {
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "log10": np.log10,
+    "exp": np.exp,
+    "abs": np.abs,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "arctan2": np.arctan2,
+    "where": np.where,
+}
+"""Functions that can be used in band expressions. All of them are supported by numexpr and NumPy."""
+
+_BAND_NAME = re.compile(r"^B([1-9][0-9]*)$")
+
+_EXPRESSION_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Compare,
+    ast.Call,
+    ast.Name,
+    ast.Constant,
+    ast.Load,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Pow,
+    ast.Mod,
+    ast.UAdd,
+    ast.USub,
+    ast.Invert,
+    ast.BitAnd,
+    ast.BitOr,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+    ast.Eq,
+    ast.NotEq,
+)
+
+
+# suffix of the band variables that hold the integer values for bit flag tests
+_BIT_SUFFIX = "_bits"
+
+
+def _operand_kind(node) -> str:
+    """
+    Returns the static type "bool", "int" or "float" of the expression node where bands are integers.
+    """
+    if isinstance(node, ast.Compare):
+        return "bool"
+    if isinstance(node, ast.Constant):
+        return "int" if isinstance(node.value, int) else "float"
+    if isinstance(node, ast.Name):
+        return "int" if _BAND_NAME.match(node.id) else "float"
+    if isinstance(node, ast.UnaryOp):
+        kind = _operand_kind(node.operand)
+        if isinstance(node.op, ast.Invert):
+            return "bool" if kind == "bool" else "float"
+        return "int" if kind == "int" and isinstance(node.op, ast.USub) else "float"
+    if isinstance(node, ast.BinOp):
+        left = _operand_kind(node.left)
+        right = _operand_kind(node.right)
+        if isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+            return left if left == right and left in ("bool", "int") else "float"
+        if left == right == "int" and isinstance(node.op, (ast.Add, ast.Sub, ast.Mult)):
+            return "int"
+    return "float"
+
+
+def _parse_expression(expression: str, band_count: int, dtype=None):
+    """
+    Validates the band expression and renames the bands in the integer operands of & and | to Bn_bits, so
+    they are evaluated on the integer values while all other operations use float32 values.
+    @return: the parsed expression, the sorted 1-based band numbers and the sets of band numbers that are
+    used as float and as integer values
+    """
+    if not expression or not expression.strip():
+        raise ValueError("Please enter an expression")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {e.msg}")
+    bands = set()
+    bit_operands = []
+    for node in ast.walk(tree):
+        if not isinstance(node, _EXPRESSION_NODES):
+            raise ValueError(
+                f"Unsupported element in expression: {type(node).__name__}"
+            )
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"Unsupported constant in expression: {node.value!r}")
+        if isinstance(node, ast.Call) and (
+            not isinstance(node.func, ast.Name)
+            or node.func.id not in EXPRESSION_FUNCTIONS
+            or node.keywords
+        ):
+            raise ValueError(
+                "Unsupported function call in expression. "
+                f"Supported functions are: {', '.join(EXPRESSION_FUNCTIONS)}"
+            )
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+            kind = _operand_kind(node)
+            if kind == "float":
+                raise ValueError(
+                    "The operators & and | combine comparisons e.g. (B1 > 0) & (B2 < 5) or test bit flags "
+                    "of integer bands with integer constants e.g. (B7 & 8) > 0."
+                )
+            if kind == "int":
+                bit_operands.append(node)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+            if _operand_kind(node.operand) != "bool":
+                raise ValueError("The operator ~ negates comparisons e.g. ~(B1 > 0).")
+        if isinstance(node, ast.Name) and node.id not in EXPRESSION_FUNCTIONS:
+            match = _BAND_NAME.match(node.id)
+            if match is None:
+                raise ValueError(
+                    f"Unknown variable '{node.id}'. Use B1, B2, ... to refer to the bands."
+                )
+            band = int(match.group(1))
+            if band_count is not None and band > band_count:
+                raise ValueError(
+                    f"Band B{band} does not exist. The raster has {band_count} band(s)."
+                )
+            bands.add(band)
+
+    if bit_operands and dtype is not None and not np.issubdtype(dtype, np.integer):
+        raise ValueError(
+            "Bit flags can only be tested with & and | on rasters with integer values."
+        )
+    for operand in bit_operands:
+        for node in ast.walk(operand):
+            if isinstance(node, ast.Name) and _BAND_NAME.match(node.id):
+                node.id += _BIT_SUFFIX
+    float_bands = set()
+    bit_bands = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id not in EXPRESSION_FUNCTIONS:
+            if node.id.endswith(_BIT_SUFFIX):
+                bit_bands.add(int(node.id[1 : -len(_BIT_SUFFIX)]))
+            else:
+                float_bands.add(int(node.id[1:]))
+    return tree, sorted(bands), float_bands, bit_bands
+
+
+def parse_band_expression(expression: str, band_count: int, dtype=None) -> List[int]:
+    """
+    Validates the band expression e.g. (B4 - B3) / (B4 + B3) where Bn refers to the n-th band.
+    Only arithmetic and comparison operators, numbers and the EXPRESSION_FUNCTIONS are allowed. & and |
+    combine comparisons or test bit flags of integer bands, which requires an integer dtype if given, and
+    ~ negates comparisons.
+    @return: sorted list of the referenced 1-based band numbers
+    """
+    return _parse_expression(expression, band_count, dtype)[1]
+
+
+def has_numexpr() -> bool:
+    """
+    Checks if the optional numexpr package is available.
+    """
+    try:
+        import numexpr  # noqa: F401
+
+        return True
+    except ImportError:
+        return False
+
+
+def evaluate_band_expression(
+    expression: str, chunk: np.ndarray, nodata=None, mask: np.ndarray = None
+):
+    """
+    Evaluates the validated band expression on the (bands, rows, cols) chunk. Referenced bands are converted to
+    float32 so integer rasters do not overflow, except for bit flag tests which use the integer values. The expression is evaluated with numexpr if available and with
+    NumPy otherwise. Pixels where any referenced band is nodata or NaN or that the validity mask marks as
+    invalid are NaN in the result.
+    @return: float32 array of shape (rows, cols)
+    """
+    tree, bands, float_bands, bit_bands = _parse_expression(
+        expression, chunk.shape[0], chunk.dtype
+    )
+    variables = {}
+    invalid = np.zeros(chunk.shape[1:], dtype=bool) if mask is None else ~mask
+    for band in bands:
+        invalid |= invalid_mask(chunk[band - 1], nodata)
+    for band in float_bands:
+        variables[f"B{band}"] = chunk[band - 1].astype(np.float32)
+    for band in bit_bands:
+        # int64 is supported by numexpr and holds all values of the smaller integer types
+        variables[f"B{band}{_BIT_SUFFIX}"] = chunk[band - 1].astype(np.int64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if has_numexpr():
+            import numexpr
+
+            result = numexpr.evaluate(ast.unparse(tree), local_dict=variables)
+        else:
+            code = compile(tree, "<expression>", "eval")
+            result = eval(
+                code, {"__builtins__": {}}, {**EXPRESSION_FUNCTIONS, **variables}
+            )
+    result = np.broadcast_to(result, chunk.shape[1:]).astype(np.float32)
+    result[invalid] = np.nan
+    return result
+
+
+############################################
+# Spectral index helper
+############################################
+
+SPECTRAL_INDICES = {
+    "NDVI": ("nir", "red"),
+    "NDWI": ("green", "nir"),
+    "EVI": ("nir", "red", "blue"),
+    "SAVI": ("nir", "red"),
+    "NDBI": ("swir1", "nir"),
+    "NBR": ("nir", "swir2"),
+}
+"""Supported spectral indices and the spectral bands they require."""
+
+
+def compute_spectral_indices(
+    chunk: np.ndarray,
+    band_map: dict,
+    indices: List[str],
+    out: np.ndarray,
+    nodata=None,
+    scale: float = 1.0,
+    savi_l: float = 0.5,
+    mask: np.ndarray = None,
+) -> None:
+    """
+    Computes the selected spectral indices for the (bands, rows, cols) chunk in a single pass and writes them
+    into the preallocated float32 out array of shape (len(indices), rows, cols). band_map maps the spectral band
+    names e.g. 'nir' to 1-based band numbers. Each required band is converted to float32 once, shared terms such
+    as NIR - Red are computed once and all operations write into preallocated buffers. Pixels where any required
+    band of an index is nodata or that the validity mask marks as invalid are NaN.
+    """
+    shape = chunk.shape[1:]
+    required = sorted({band for index in indices for band in SPECTRAL_INDICES[index]})
+    values = {}
+    invalid = {}
+    for name in required:
+        source = chunk[band_map[name] - 1]
+        buffer = np.empty(shape, dtype=np.float32)
+        np.divide(source, scale, out=buffer, casting="unsafe")
+        invalid[name] = invalid_mask(source, nodata, mask)
+        values[name] = buffer
+
+    terms = {}
+
+    def term(a: str, operation, b: str) -> np.ndarray:
+        # intermediate terms that are shared by several indices are only computed once
+        key = (a, operation.__name__, b)
+        if key not in terms:
+            terms[key] = operation(values[a], values[b])
+        return terms[key]
+
+    scratch = np.empty(shape, dtype=np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for target, index in zip(out, indices):
+            if index == "NDVI":
+                np.divide(
+                    term("nir", np.subtract, "red"),
+                    term("nir", np.add, "red"),
+                    out=target,
+                )
+            elif index == "NDWI":
+                np.divide(
+                    term("green", np.subtract, "nir"),
+                    term("green", np.add, "nir"),
+                    out=target,
+                )
+            elif index == "NDBI":
+                np.divide(
+                    term("swir1", np.subtract, "nir"),
+                    term("swir1", np.add, "nir"),
+                    out=target,
+                )
+            elif index == "NBR":
+                np.divide(
+                    term("nir", np.subtract, "swir2"),
+                    term("nir", np.add, "swir2"),
+                    out=target,
+                )
+            elif index == "SAVI":
+                np.add(term("nir", np.add, "red"), savi_l, out=scratch)
+                np.multiply(term("nir", np.subtract, "red"), 1 + savi_l, out=target)
+                np.divide(target, scratch, out=target)
+            elif index == "EVI":
+                # 2.5 * (NIR - Red) / (NIR + 6 * Red - 7.5 * Blue + 1)
+                np.multiply(values["blue"], -7.5, out=scratch)
+                np.add(scratch, values["nir"], out=scratch)
+                np.multiply(values["red"], 6.0, out=target)
+                np.add(scratch, target, out=scratch)
+                np.add(scratch, 1.0, out=scratch)
+                np.multiply(term("nir", np.subtract, "red"), 2.5, out=target)
+                np.divide(target, scratch, out=target)
+            else:
+                raise ValueError(f"Unsupported spectral index: {index}")
+            for name in SPECTRAL_INDICES[index]:
+                target[invalid[name]] = np.nan
+
+
+############################################
+# Reclassification helper
+############################################
+
+# integer rasters with at most this many possible values are reclassified with a dense lookup table
+__MAX_LUT_SIZE = 2**16
+
+
+def _parse_number(text: str, default: float = None) -> float:
+    text = text.strip()
+    if not text and default is not None:
+        return default
+    return float(text)
+
+
+def parse_reclass_rules(rules: str, mode: str = "ranges") -> dict:
+    """
+    Parses the reclassification rules which are separated by semicolons or new lines. In the ranges mode each
+    rule has the form lower:upper=class where the lower bound is inclusive, the upper bound exclusive and an
+    empty bound is open e.g. ":0=1; 0:500=2; 500:=3". In the values mode each rule has the form value=class
+    e.g. "1=10; 2=10; 3=20".
+    @return: dict with the sorted keys (values or lower and upper bounds) and their classes
+    """
+    entries = [r.strip() for r in re.split(r"[;\n]", rules or "") if r.strip()]
+    if not entries:
+        raise ValueError("Please enter at least one reclassification rule")
+    keys = []
+    classes = []
+    for entry in entries:
+        try:
+            key, value = entry.split("=")
+            classes.append(_parse_number(value))
+            if mode == "ranges":
+                lower, upper = key.split(":")
+                keys.append(
+                    (_parse_number(lower, -np.inf), _parse_number(upper, np.inf))
+                )
+            else:
+                keys.append(_parse_number(key))
+        except ValueError:
+            example = "lower:upper=class" if mode == "ranges" else "value=class"
+            raise ValueError(
+                f"Invalid rule '{entry}'. Enter rules of the form {example} separated by semicolons."
+            )
+    order = np.argsort([k[0] if mode == "ranges" else k for k in keys], kind="stable")
+    keys = np.array(keys, dtype=np.float64)[order]
+    classes = np.array(classes, dtype=np.float64)[order]
+    if mode == "ranges":
+        if np.any(keys[:, 0] >= keys[:, 1]):
+            raise ValueError(
+                "The lower bound of each range must be smaller than its upper bound"
+            )
+        if np.any(keys[1:, 0] < keys[:-1, 1]):
+            raise ValueError("The ranges must not overlap")
+        return {"lowers": keys[:, 0], "uppers": keys[:, 1], "classes": classes}
+    if len(np.unique(keys)) < len(keys):
+        raise ValueError("Each value can only be mapped once")
+    return {"values": keys, "classes": classes}
+
+
+def reclass_dtype(
+    rules: dict, src_dtype, keep_unmapped: bool, out_nodata: float
+) -> np.dtype:
+    """
+    Returns the smallest data type that holds all classes, the nodata value and, if unmapped values are kept,
+    the values of the source data type.
+    """
+    values = np.append(rules["classes"], out_nodata)
+    if np.all(values == np.round(values)):
+        fitting = [
+            t
+            for t in ("uint8", "int8", "uint16", "int16", "uint32", "int32", "int64")
+            if np.iinfo(t).min <= values.min() and values.max() <= np.iinfo(t).max
+        ]
+        dtype = np.dtype(fitting[0] if fitting else np.float64)
+    else:
+        dtype = np.dtype(np.float32)
+    if keep_unmapped:
+        dtype = np.result_type(dtype, src_dtype)
+    return dtype
+
+
+def _lookup(values: np.ndarray, rules: dict):
+    """
+    Returns the index of the rule that applies to each value and the mask of the values that a rule applies to.
+    """
+    if "lowers" in rules:
+        index = np.searchsorted(rules["lowers"], values, side="right") - 1
+        np.maximum(index, 0, out=index)
+        matched = (values >= rules["lowers"][index]) & (values < rules["uppers"][index])
+    else:
+        index = np.searchsorted(rules["values"], values)
+        np.minimum(index, len(rules["values"]) - 1, out=index)
+        matched = rules["values"][index] == values
+    return index, matched
+
+
+def reclass_lut(
+    rules: dict,
+    src_dtype,
+    out_dtype,
+    nodata=None,
+    keep_unmapped: bool = False,
+    out_nodata: float = 0,
+):
+    """
+    Builds a dense lookup table with the class of every possible value of 8 and 16 bit integer rasters.
+    @return: the lookup table and the offset of its first value or None if the data type is not supported
+    """
+    src_dtype = np.dtype(src_dtype)
+    if not np.issubdtype(src_dtype, np.integer):
+        return None
+    info = np.iinfo(src_dtype)
+    if int(info.max) - int(info.min) + 1 > __MAX_LUT_SIZE:
+        return None
+    values = np.arange(int(info.min), int(info.max) + 1, dtype=np.int64)
+    lut = np.empty(len(values), dtype=out_dtype)
+    reclassify(values.astype(src_dtype), rules, lut, nodata, keep_unmapped, out_nodata)
+    return lut, int(info.min)
+
+
+def reclassify(
+    chunk: np.ndarray,
+    rules: dict,
+    out: np.ndarray,
+    nodata=None,
+    keep_unmapped: bool = False,
+    out_nodata: float = 0,
+    lut=None,
+    mask: np.ndarray = None,
+) -> None:
+    """
+    Reclassifies the chunk into the preallocated out array of the same shape. Ranges are looked up with
+    a binary search over the sorted lower bounds and values with a binary search over the sorted values. With
+    a lookup table from reclass_lut the classes are gathered from the table instead. Nodata pixels, pixels that
+    the validity mask marks as invalid and, unless they are kept, values that no rule applies to get the
+    out_nodata value.
+    """
+    if lut is not None:
+        table, offset = lut
+        index = chunk.astype(np.int64)
+        if offset:
+            index -= offset
+        np.take(table, index, out=out)
+        if mask is not None:
+            out[..., ~mask] = out_nodata
+        return
+    index, matched = _lookup(chunk, rules)
+    np.take(rules["classes"], index, out=out, mode="clip")
+    if keep_unmapped:
+        np.copyto(out, chunk, where=~matched, casting="unsafe")
+    else:
+        out[~matched] = out_nodata
+    out[invalid_mask(chunk, nodata, mask)] = out_nodata
+
+
+############################################
+# Change detection helper
+############################################
+
+CHANGE_METHODS = ["difference", "ratio", "change mask"]
+"""Supported outputs of the change detection."""
+
+CHANGE_CLASSES = ["Nodata", "Decrease", "No change", "Increase"]
+"""Names of the change classes whose index is the class value of the change mask."""
+
+
+def detect_change(
+    before: np.ndarray,
+    after: np.ndarray,
+    method: str,
+    threshold: float,
+    before_nodata=None,
+    after_nodata=None,
+    before_mask: np.ndarray = None,
+    after_mask: np.ndarray = None,
+):
+    """
+    Compares the (bands, rows, cols) chunks of two co-registered rasters. The change is after - before for
+    the difference and the change mask and after / before - 1 for the ratio. Pixels whose change is below
+    -threshold are classified as decrease and above threshold as increase. Pixels that are invalid in either
+    raster or whose ratio is undefined are nodata.
+    @return: float32 difference or ratio with NaN for nodata or the uint8 change mask with the class index of
+    CHANGE_CLASSES, and the (bands, classes) pixel counts of the classes
+    """
+    invalid = invalid_mask(before, before_nodata, before_mask) | invalid_mask(
+        after, after_nodata, after_mask
+    )
+    change = after.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if method == "ratio":
+            ratio = change / before
+            np.subtract(ratio, 1.0, out=change)
+            invalid |= ~np.isfinite(ratio)
+        else:
+            np.subtract(change, before, out=change)
+
+    classes = np.full(change.shape, 2, dtype=np.uint8)
+    classes[change < -threshold] = 1
+    classes[change > threshold] = 3
+    classes[invalid] = 0
+    counts = np.stack(
+        [np.bincount(band.ravel(), minlength=len(CHANGE_CLASSES)) for band in classes]
+    )
+
+    if method == "change mask":
+        return classes, counts
+    values = (ratio if method == "ratio" else change).astype(np.float32)
+    values[invalid] = np.nan
+    return values, counts
+
+
+############################################
+# Polygonize helper
+############################################
+
+__SHAPES_DTYPES = ("int16", "int32", "uint8", "uint16", "float32")
+
+
+def polygonize_tile(
+    band: np.ndarray,
+    window,
+    height: int,
+    width: int,
+    nodata=None,
+    connectivity=4,
+    mask: np.ndarray = None,
+):
+    """
+    Polygonizes the window of the 2-D band in pixel coordinates of the whole raster. Pixels that are nodata
+    or NaN or that the validity mask of the whole raster marks as invalid are skipped. Polygons that touch an
+    inner tile border are returned separately since they might continue in the neighbouring tile.
+    @return: (final, seam) lists of (polygon, value) tuples
+    """
+    from affine import Affine
+    from rasterio.features import shapes
+    from shapely.geometry import shape
+
+    row_start, row_stop, col_start, col_stop = window
+    tile = band[row_start:row_stop, col_start:col_stop]
+    if tile.dtype.name not in __SHAPES_DTYPES:
+        tile = tile.astype(np.float32)
+    valid = ~invalid_mask(
+        tile,
+        nodata,
+        None if mask is None else mask[row_start:row_stop, col_start:col_stop],
+    )
+
+    # borders of the tile that are shared with a neighbouring tile
+    seams = (
+        row_start if row_start > 0 else None,
+        row_stop if row_stop < height else None,
+        col_start if col_start > 0 else None,
+        col_stop if col_stop < width else None,
+    )
+    final = []
+    seam = []
+    for geometry, value in shapes(
+        tile,
+        mask=valid,
+        connectivity=connectivity,
+        transform=Affine.translation(col_start, row_start),
+    ):
+        polygon = shape(geometry)
+        min_col, min_row, max_col, max_row = polygon.bounds
+        if (
+            min_row == seams[0]
+            or max_row == seams[1]
+            or min_col == seams[2]
+            or max_col == seams[3]
+        ):
+            seam.append((polygon, value))
+        else:
+            final.append((polygon, value))
+    return final, seam
+
+
+def merge_seam_polygons(seam_polygons, connectivity=4):
+    """
+    Dissolves the polygons of equal value that were split at tile borders. Pieces belong to the same region
+    if they share an edge or, with 8-connectivity, also if they only touch at a corner. Each region is
+    returned as a single geometry, which is a MultiPolygon for regions that are only joined diagonally.
+    @return: list of (polygon, value) tuples
+    """
+    import shapely
+    from shapely.ops import unary_union
+
+    by_value = {}
+    for polygon, value in seam_polygons:
+        by_value.setdefault(value, []).append(polygon)
+    merged = []
+    for value, polygons in by_value.items():
+        geometries = np.array(polygons, dtype=object)
+        left, right = shapely.STRtree(geometries).query(
+            geometries, predicate="intersects"
+        )
+        pairs = left < right
+        left, right = left[pairs], right[pairs]
+        if connectivity == 4:
+            # pieces that only touch at a corner are separate regions
+            edge = shapely.relate_pattern(
+                geometries[left], geometries[right], "****1****"
+            )
+            left, right = left[edge], right[edge]
+
+        # union find over the touching pieces
+        parent = list(range(len(geometries)))
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        for a, b in zip(left, right):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[root_b] = root_a
+        groups = {}
+        for index in range(len(geometries)):
+            groups.setdefault(find(index), []).append(geometries[index])
+        merged.extend(
+            (group[0] if len(group) == 1 else unary_union(group), value)
+            for group in groups.values()
+        )
+    return merged
@@ -0,0 +1,200 @@
+import logging
+from typing import List
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+# number of weighted centroids that approximate the value distribution of a band
+__SKETCH_SIZE = 1024
+
+
+############################################
+# Mergeable band statistics
+############################################
+# The statistics of a band are kept in a dict with the keys count, nodata_count, min, max, mean, m2 and the
+# quantile sketch (sketch_values, sketch_weights). 8 and 16 bit integer bands additionally keep exact value
+# counts (value_counts, value_offset) which are used for exact percentiles and histograms. Partial statistics
+# of tiles can be merged in any order, which allows to compute them in a single parallel pass over the raster.
+
+
+def _compress_sketch(values: np.ndarray, weights: np.ndarray, size: int):
+    """
+    Reduces the weighted values to at most size centroids of roughly equal weight.
+    """
+    if len(values) <= size:
+        return values, weights
+    order = np.argsort(values, kind="stable")
+    values = values[order]
+    weights = weights[order]
+    cumulative = np.cumsum(weights)
+    groups = np.minimum(
+        (cumulative - weights / 2) * size // cumulative[-1], size - 1
+    ).astype(np.int64)
+    group_weights = np.bincount(groups, weights=weights, minlength=size)
+    group_sums = np.bincount(groups, weights=values * weights, minlength=size)
+    used = group_weights > 0
+    return group_sums[used] / group_weights[used], group_weights[used]
+
+
+def band_statistics(values: np.ndarray, nodata=None, mask: np.ndarray = None) -> dict:
+    """
+    Computes the partial statistics of the pixel values of one band of a tile. Nodata values, NaNs and pixels
+    that the validity mask marks as invalid are counted as nodata and excluded from all other statistics.
+    """
+    values = np.asarray(values).ravel()
+    exact = np.issubdtype(values.dtype, np.integer) and values.dtype.itemsize <= 2
+    value_offset = int(np.iinfo(values.dtype).min) if exact else 0
+    valid = ~np.isnan(values) if np.issubdtype(values.dtype, np.floating) else None
+    if nodata is not None and not np.isnan(nodata):
+        not_nodata = values != nodata
+        valid = not_nodata if valid is None else valid & not_nodata
+    if mask is not None:
+        valid = mask.ravel() if valid is None else valid & mask.ravel()
+    if valid is not None:
+        total = len(values)
+        values = values[valid]
+        nodata_count = total - len(values)
+    else:
+        nodata_count = 0
+
+    value_counts = None
+    if exact:
+        value_counts = np.bincount(
+            values.astype(np.int64) - value_offset,
+            minlength=2 ** (8 * np.dtype(values.dtype).itemsize),
+        )
+
+    if len(values) == 0:
+        return {
+            "value_counts": value_counts,
+            "value_offset": value_offset,
+            "count": 0,
+            "nodata_count": nodata_count,
+            "min": np.nan,
+            "max": np.nan,
+            "mean": 0.0,
+            "m2": 0.0,
+            "sketch_values": np.empty(0),
+            "sketch_weights": np.empty(0),
+        }
+
+    values = values.astype(np.float64)
+    mean = values.mean()
+    # the quantiles of the tile are a sketch whose rank error is bounded by 1 / sketch size
+    if len(values) > __SKETCH_SIZE:
+        sketch_values = np.quantile(
+            values, (np.arange(__SKETCH_SIZE) + 0.5) / __SKETCH_SIZE
+        )
+        sketch_weights = np.full(__SKETCH_SIZE, len(values) / __SKETCH_SIZE)
+    else:
+        sketch_values = values
+        sketch_weights = np.ones(len(values))
+    return {
+        "value_counts": value_counts,
+        "value_offset": value_offset,
+        "count": len(values),
+        "nodata_count": nodata_count,
+        "min": values.min(),
+        "max": values.max(),
+        "mean": mean,
+        "m2": np.square(values - mean).sum(),
+        "sketch_values": sketch_values,
+        "sketch_weights": sketch_weights,
+    }
+
+
+def merge_statistics(a: dict, b: dict) -> dict:
+    """
+    Merges two partial statistics of the same band. Mean and variance are combined with the
+    parallel algorithm of Chan et al.
+    """
+    count = a["count"] + b["count"]
+    value_counts = None
+    if a["value_counts"] is not None and b["value_counts"] is not None:
+        value_counts = a["value_counts"] + b["value_counts"]
+    if a["count"] == 0 or b["count"] == 0:
+        merged = dict(a if b["count"] == 0 else b)
+        merged["nodata_count"] = a["nodata_count"] + b["nodata_count"]
+        merged["value_counts"] = value_counts
+        return merged
+    delta = b["mean"] - a["mean"]
+    sketch_values, sketch_weights = _compress_sketch(
+        np.concatenate([a["sketch_values"], b["sketch_values"]]),
+        np.concatenate([a["sketch_weights"], b["sketch_weights"]]),
+        __SKETCH_SIZE,
+    )
+    return {
+        "value_counts": value_counts,
+        "value_offset": a["value_offset"],
+        "count": count,
+        "nodata_count": a["nodata_count"] + b["nodata_count"],
+        "min": min(a["min"], b["min"]),
+        "max": max(a["max"], b["max"]),
+        "mean": a["mean"] + delta * b["count"] / count,
+        "m2": a["m2"] + b["m2"] + delta**2 * a["count"] * b["count"] / count,
+        "sketch_values": sketch_values,
+        "sketch_weights": sketch_weights,
+    }
+
+
+def std(stats: dict) -> float:
+    """
+    Returns the population standard deviation of the merged statistics.
+    """
+    if stats["count"] == 0:
+        return np.nan
+    return float(np.sqrt(stats["m2"] / stats["count"]))
+
+
+def percentiles(stats: dict, percentages: List[float]) -> np.ndarray:
+    """
+    Returns the percentiles (0-100) which are exact for 8 and 16 bit integer bands and otherwise
+    approximated by interpolating the cumulative weights of the sketch.
+    """
+    if stats["count"] == 0:
+        return np.full(len(percentages), np.nan)
+    if stats["value_counts"] is not None:
+        cumulative = np.cumsum(stats["value_counts"])
+        # nearest rank definition of the percentile
+        ranks = np.maximum(
+            np.ceil(np.asarray(percentages, dtype=np.float64) / 100 * stats["count"]), 1
+        )
+        return (
+            np.searchsorted(cumulative, ranks).astype(np.float64)
+            + stats["value_offset"]
+        )
+    order = np.argsort(stats["sketch_values"], kind="stable")
+    values = stats["sketch_values"][order]
+    weights = stats["sketch_weights"][order]
+    # each centroid represents the middle of its weight
+    ranks = (np.cumsum(weights) - weights / 2) / weights.sum()
+    ranks = np.concatenate([[0.0], ranks, [1.0]])
+    values = np.concatenate([[stats["min"]], values, [stats["max"]]])
+    return np.interp(np.asarray(percentages, dtype=np.float64) / 100, ranks, values)
+
+
+def histogram(stats: dict, bins: int):
+    """
+    Returns the histogram of the band with equally sized bins between min and max. The counts are exact for
+    8 and 16 bit integer bands and approximated from the sketch otherwise.
+    @return: the counts and the bin edges
+    """
+    if stats["count"] == 0:
+        return np.zeros(bins), np.full(bins + 1, np.nan)
+    if stats["value_counts"] is not None:
+        used = np.nonzero(stats["value_counts"])[0]
+        return np.histogram(
+            used + stats["value_offset"],
+            bins=bins,
+            range=(stats["min"], stats["max"]),
+            weights=stats["value_counts"][used],
+        )
+    counts, edges = np.histogram(
+        stats["sketch_values"],
+        bins=bins,
+        range=(stats["min"], stats["max"]),
+        weights=stats["sketch_weights"],
+    )
+    # scale the fractional sketch weights to whole pixel counts
+    return np.round(counts * stats["count"] / counts.sum()), edges
@@ -0,0 +1,155 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import Callable
+from typing import List
+from typing import Tuple
+
+import numpy as np
+
+import util.knime_utils as knut
+import util.raster_utils as rut
+
+LOGGER = logging.getLogger(__name__)
+
+Window = Tuple[int, int, int, int]
+"""A pixel window given as (row_start, row_stop, col_start, col_stop)."""
+
+
+############################################
+# Window helper
+############################################
+
+
+def tile_windows(height: int, width: int, tile_size: int) -> List[Window]:
+    """
+    Splits a raster into square tiles of at most tile_size pixels per side.
+    """
+    return rut.block_windows(height, width, tile_size)
+
+
+def row_windows(height: int, width: int, rows: int) -> List[Window]:
+    """
+    Splits a raster into bands of at most the given number of rows that span the whole width. Row bands are
+    contiguous in memory which makes them the preferred tiling for pixel-wise operations.
+    """
+    return [(row, min(row + rows, height), 0, width) for row in range(0, height, rows)]
+
+
+def read_window(
+    array: np.ndarray, window: Window, row_halo: int = 0, col_halo: int = 0
+) -> np.ndarray:
+    """
+    Returns the window of the array extended by the halo. The last two axes of the array are the rows
+    and columns. The halo is read from the neighbouring pixels and mirrored at the raster border so the
+    result always has the shape of the window plus twice the halo. Without halo a view is returned.
+    """
+    row_start, row_stop, col_start, col_stop = window
+    height, width = array.shape[-2:]
+    top = max(row_start - row_halo, 0)
+    bottom = min(row_stop + row_halo, height)
+    left = max(col_start - col_halo, 0)
+    right = min(col_stop + col_halo, width)
+    tile = array[..., top:bottom, left:right]
+    padding = (
+        (row_halo - (row_start - top), row_halo - (bottom - row_stop)),
+        (col_halo - (col_start - left), col_halo - (right - col_stop)),
+    )
+    if not any(any(p) for p in padding):
+        return tile
+    return np.pad(tile, ((0, 0),) * (array.ndim - 2) + padding, mode="symmetric")
+
+
+############################################
+# Tile execution engine
+############################################
+
+# function that is executed by each worker process, set once per process by the pool initializer
+__process_tile_func = None
+
+
+def _init_process(tile_func: Callable) -> None:
+    global __process_tile_func
+    __process_tile_func = tile_func
+
+
+def _run_process_tile(window: Window):
+    return __process_tile_func(window)
+
+
+def run_tiles(
+    tile_func: Callable[[Window], np.ndarray],
+    windows: List[Window],
+    out: np.ndarray = None,
+    on_result: Callable = None,
+    exec_context=None,
+    num_threads: int = 0,
+    use_processes: bool = False,
+    progress_start: float = 0.1,
+    progress_end: float = 0.9,
+    message: str = "Processed tile",
+) -> list:
+    """
+    Executes tile_func for each window in a thread or process pool.
+
+    If out is given the array returned by tile_func is stitched into out[..., row_start:row_stop,
+    col_start:col_stop] as soon as the tile is done, otherwise the results are returned in the order of the
+    windows. Without out the windows can be arbitrary work items e.g. geometries. If on_result is given it is
+    called with the window and the result of each tile in the calling thread as soon as the tile is done, which
+    allows to reduce mergeable partial results without keeping them all in memory.
+
+    At most twice as many tiles as workers are in flight at any time, which bounds the memory held by pending
+    results. If an exec_context is given the progress is reported between progress_start and progress_end
+    and the execution is stopped once the user cancels it.
+
+    Threads share the input arrays and work well for NumPy, GDAL and numexpr operations that release the
+    GIL. With use_processes tile_func needs to be picklable and is sent to every worker process only once.
+    @return: list with the result of each window or None for stitched and reduced tiles
+    """
+    workers = min(rut.get_worker_count(num_threads), max(len(windows), 1))
+    results = [None] * len(windows)
+    if use_processes:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_process, initargs=(tile_func,)
+        )
+        func = _run_process_tile
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        func = tile_func
+
+    pending = {}
+    next_window = 0
+    done_count = 0
+    try:
+        while next_window < len(windows) or pending:
+            while next_window < len(windows) and len(pending) < 2 * workers:
+                future = executor.submit(func, windows[next_window])
+                pending[future] = next_window
+                next_window += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                result = future.result()
+                if on_result is not None:
+                    on_result(windows[index], result)
+                elif out is not None:
+                    if result is not None:
+                        row_start, row_stop, col_start, col_stop = windows[index]
+                        out[..., row_start:row_stop, col_start:col_stop] = result
+                else:
+                    results[index] = result
+                done_count += 1
+            if exec_context is not None:
+                knut.check_canceled(exec_context)
+                exec_context.set_progress(
+                    progress_start
+                    + (progress_end - progress_start) * done_count / len(windows),
+                    f"{message} {done_count} of {len(windows)}",
+                )
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+    return results
@@ -0,0 +1,696 @@
+import base64
+import hashlib
+import logging
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import warnings
+import zlib
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+import util.raster_utils as rut
+import util.tiling as tiling
+
+LOGGER = logging.getLogger(__name__)
+
+DOWNSAMPLING_METHODS = ["average", "decimate"]
+"""Supported methods to reduce a raster to the display size."""
+
+STRETCH_METHODS = ["min-max", "percentile"]
+"""Supported methods to derive the value range that is mapped to the colors."""
+
+COLOR_MAPS = [
+    "viridis",
+    "plasma",
+    "inferno",
+    "magma",
+    "cividis",
+    "Greys",
+    "Purples",
+    "Blues",
+    "Greens",
+    "Oranges",
+    "Reds",
+    "YlOrBr",
+    "YlGnBu",
+    "cool",
+    "hot",
+    "spring",
+]
+"""Matplotlib color maps that are offered for single band views."""
+
+BASE_MAPS = [
+    "CartoDB DarkMatter",
+    "CartoDB DarkMatterNoLabels",
+    "CartoDB DarkMatterOnlyLabels",
+    "CartoDB Positron",
+    "CartoDB PositronNoLabels",
+    "CartoDB PositronOnlyLabels",
+    "CartoDB Voyager",
+    "CartoDB VoyagerLabelsUnder",
+    "CartoDB VoyagerNoLabels",
+    "CartoDB VoyagerOnlyLabels",
+    "Esri DeLorme",
+    "Esri NatGeoWorldMap",
+    "Esri OceanBasemap",
+    "Esri WorldGrayCanvas",
+    "Esri WorldImagery",
+    "Esri WorldPhysical",
+    "Esri WorldShadedRelief",
+    "Esri WorldStreetMap",
+    "Esri WorldTerrain",
+    "Esri WorldTopoMap",
+    "Gaode Normal",
+    "Gaode Satellite",
+    "NASAGIBS ASTER_GDEM_Greyscale_Shaded_Relief",
+    "NASAGIBS BlueMarble",
+    "NASAGIBS BlueMarble3031",
+    "NASAGIBS BlueMarble3413",
+    "NASAGIBS ModisAquaBands721CR",
+    "NASAGIBS ModisAquaTrueColorCR",
+    "NASAGIBS ModisTerraAOD",
+    "NASAGIBS ModisTerraBands367CR",
+    "NASAGIBS ModisTerraBands721CR",
+    "NASAGIBS ModisTerraChlorophyll",
+    "NASAGIBS ModisTerraLSTDay",
+    "NASAGIBS ModisTerraSnowCover",
+    "NASAGIBS ModisTerraTrueColorCR",
+    "NASAGIBS ViirsEarthAtNight2012",
+    "NASAGIBS ViirsTrueColorCR",
+    "OpenRailwayMap",
+    "OpenStreetMap",
+    "Stamen Terrain",
+    "Stamen TerrainBackground",
+    "Stamen TerrainLabels",
+    "Stamen Toner",
+    "Stamen TonerBackground",
+    "Stamen TonerHybrid",
+    "Stamen TonerLabels",
+    "Stamen TonerLines",
+    "Stamen TonerLite",
+    "Stamen TopOSMFeatures",
+    "Stamen TopOSMRelief",
+    "Stamen Watercolor",
+    "Strava All",
+    "Strava Ride",
+    "Strava Run",
+    "Strava Water",
+    "Strava Winter",
+]
+"""Folium base maps that are offered by the map views."""
+
+
+############################################
+# Display downsampling
+############################################
+
+
+def display_factor(height: int, width: int, max_pixels: int) -> int:
+    """
+    Returns the smallest integer factor that reduces a raster of the given shape to at most max_pixels pixels.
+    """
+    if max_pixels is None or max_pixels <= 0 or height * width <= max_pixels:
+        return 1
+    factor = int(np.ceil(np.sqrt(height * width / max_pixels)))
+    while -(-height // factor) * -(-width // factor) > max_pixels:
+        factor += 1
+    return factor
+
+
+def downsample(
+    im_data: np.ndarray,
+    bands: List[int],
+    factor: int,
+    method: str = "average",
+    nodata=None,
+    mask: np.ndarray = None,
+    num_threads: int = 0,
+) -> np.ndarray:
+    """
+    Reduces the selected 0-based bands of the (bands, height, width) array by the integer factor. Averaging
+    computes the mean of the valid pixels of each factor x factor block in parallel row bands, decimation
+    picks every factor-th pixel. Only the reduced array is converted to float, so the memory needed does not
+    depend on the size of the raster.
+    @return: float64 array of shape (len(bands), ceil(height / factor), ceil(width / factor)) with NaN for
+    invalid pixels
+    """
+    if factor <= 1 or method == "decimate":
+        # slicing first keeps the fancy indexing copy as small as the display
+        chunk = im_data[:, ::factor, ::factor][bands]
+        chunk_mask = None if mask is None else mask[::factor, ::factor]
+        display = chunk.astype(np.float64)
+        display[rut.invalid_mask(chunk, nodata, chunk_mask)] = np.nan
+        return display
+
+    height, width = im_data.shape[-2:]
+    display = np.empty((len(bands), -(-height // factor), -(-width // factor)))
+
+    def average_rows(window):
+        row_start, row_stop, _, _ = window
+        chunk = im_data[bands, row_start:row_stop]
+        values = chunk.astype(np.float64)
+        values[
+            rut.invalid_mask(
+                chunk, nodata, None if mask is None else mask[row_start:row_stop]
+            )
+        ] = np.nan
+        return rut.aggregate_blocks(values, factor, "mean")
+
+    # the row bands are aligned with the blocks and written into the matching display rows
+    rows = max(256 // factor, 1) * factor
+    windows = tiling.row_windows(height, width, rows)
+    results = tiling.run_tiles(average_rows, windows, num_threads=num_threads)
+    for (row_start, _, _, _), result in zip(windows, results):
+        display[:, row_start // factor : row_start // factor + result.shape[1]] = result
+    return display
+
+
+def display_transform(transform, factor: int):
+    """
+    Returns the affine transform of the raster downsampled by the factor.
+    """
+    from affine import Affine
+
+    return transform * Affine.scale(factor)
+
+
+def warp_to_mercator(
+    display: np.ndarray, transform, crs, num_threads: int = 0
+) -> tuple:
+    """
+    Reprojects the (bands, height, width) float display array with NaN for invalid pixels to EPSG:3857 with
+    a single multithreaded GDAL call. Web maps stretch image overlays linearly in Web Mercator, so only the
+    warped array is placed correctly between its corner coordinates. The display array is already reduced
+    to the display size, which makes the cost independent of the size of the raster.
+    @return: the warped float array with NaN outside of the raster and its (left, bottom, right, top) bounds
+    in EPSG:4326
+    """
+    from rasterio.crs import CRS
+    from rasterio.warp import transform_bounds
+
+    if CRS.from_user_input(crs) == CRS.from_epsg(3857):
+        warped, warped_transform = display, transform
+    else:
+        warped, warped_transform = rut.reproject_array(
+            display,
+            transform,
+            crs,
+            "EPSG:3857",
+            nodata=np.nan,
+            num_threads=num_threads,
+            block_size=0,
+        )
+    height, width = warped.shape[-2:]
+    return warped, transform_bounds(
+        "EPSG:3857",
+        "EPSG:4326",
+        *rut.bounds_from_transform(warped_transform, width, height),
+    )
+
+
+############################################
+# Colorization
+############################################
+
+
+def band_range(display: np.ndarray):
+    """
+    Returns the per band minimum and maximum of the valid pixels of the (bands, height, width) display array.
+    """
+    with warnings.catch_warnings():
+        # bands without valid pixels are expected for fully masked rasters
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmin(display, axis=(1, 2)), np.nanmax(display, axis=(1, 2))
+
+
+# quantized value of invalid pixels which is transparent in the lookup table
+__INVALID_INDEX = 255
+
+
+def color_lut(color_map: str) -> np.ndarray:
+    """
+    Returns the 256 entry RGBA lookup table of the matplotlib color map. The first 255 entries sample the color
+    map evenly, the last entry is transparent and used for invalid pixels.
+    """
+    import matplotlib.pyplot as plt
+
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    lut[:__INVALID_INDEX] = plt.get_cmap(color_map)(
+        np.linspace(0, 1, __INVALID_INDEX), bytes=True
+    )
+    return lut
+
+
+def quantize(
+    band: np.ndarray, vmin: float, vmax: float, levels: int = 255
+) -> np.ndarray:
+    """
+    Stretches the float band linearly between vmin and vmax and quantizes it to the integers 0 to levels - 1
+    in a single buffer. NaN pixels get the index 255.
+    @return: uint8 array with the shape of the band
+    """
+    scale = (levels - 1) / (vmax - vmin) if vmax > vmin else 0.0
+    buffer = np.subtract(band, vmin, dtype=np.float32)
+    np.multiply(buffer, scale, out=buffer)
+    np.clip(buffer, 0, levels - 1, out=buffer)
+    np.add(buffer, 0.5, out=buffer)
+    invalid = np.isnan(buffer)
+    buffer[invalid] = 0
+    result = buffer.astype(np.uint8)
+    result[invalid] = __INVALID_INDEX
+    return result
+
+
+def colorize(
+    display: np.ndarray, vmin: np.ndarray, vmax: np.ndarray, color_map: str = None
+) -> np.ndarray:
+    """
+    Colors the (bands, height, width) float array with NaN for invalid pixels. A single band is stretched
+    linearly between its vmin and vmax, quantized to uint8 once and mapped through the lookup table of the
+    color map. Three bands are stretched the same way and used as red, green and blue. Invalid pixels are
+    transparent.
+    @return: uint8 RGBA array of shape (height, width, 4)
+    """
+    if len(display) == 1:
+        return color_lut(color_map)[quantize(display[0], vmin[0], vmax[0])]
+    rgba = np.empty(display.shape[1:] + (4,), dtype=np.uint8)
+    for i, band in enumerate(display):
+        rgba[..., i] = quantize(band, vmin[i], vmax[i], 256)
+    rgba[..., 3] = np.where(np.isnan(display).any(axis=0), 0, 255)
+    return rgba
+
+
+############################################
+# Contrast stretch
+############################################
+
+# stretch ranges of recently viewed rasters that are reused by repeated executions
+__STRETCH_CACHE = OrderedDict()
+__STRETCH_CACHE_SIZE = 256
+__STRETCH_CACHE_LOCK = threading.Lock()
+
+
+def payload_key(data: bytes) -> str:
+    """
+    Returns a hash of the complete raster port data that identifies it in caches, so any changed pixel gives
+    a different key. The optional xxhash package is used if available since it hashes several GB per second,
+    otherwise BLAKE2b.
+    """
+    try:
+        import xxhash
+
+        return "xxh3-" + xxhash.xxh3_128_hexdigest(data)
+    except ImportError:
+        return hashlib.blake2b(memoryview(data), digest_size=16).hexdigest()
+
+
+def sample_band(
+    im_data: np.ndarray,
+    band: int,
+    nodata=None,
+    mask: np.ndarray = None,
+    max_samples: int = 1000000,
+) -> np.ndarray:
+    """
+    Returns the valid values of a regular grid of at most max_samples pixels of the 0-based band. The strided
+    view is only copied for the sampled pixels, so the cost does not depend on the size of the raster.
+    @return: float64 array with the sampled values
+    """
+    height, width = im_data.shape[-2:]
+    step = max(int(np.ceil(np.sqrt(height * width / max_samples))), 1)
+    chunk = im_data[band, ::step, ::step]
+    invalid = rut.invalid_mask(
+        chunk, nodata, None if mask is None else mask[::step, ::step]
+    )
+    return chunk[~invalid].astype(np.float64)
+
+
+def stretch_range(
+    im_data: np.ndarray,
+    bands: List[int],
+    method: str = "min-max",
+    lower: float = 2.0,
+    upper: float = 98.0,
+    nodata=None,
+    mask: np.ndarray = None,
+    stats: dict = None,
+    key: str = None,
+    display: np.ndarray = None,
+):
+    """
+    Returns the per band values that are mapped to the lowest and highest color of the 0-based bands.
+
+    The min-max stretch uses the minimum and maximum of the band. The percentile stretch uses the lower and
+    upper percentiles (0-100), which keeps a few extreme pixels from compressing the colors of all others.
+    Statistics that are stored in the payload are used first. Otherwise min-max is computed from the
+    display array if given and everything else from a strided pixel sample. If the key of the payload is
+    given the sampled ranges are cached, so repeated executions for the same raster do not scan it again.
+    @return: float64 arrays vmin and vmax with one value per band and NaN for bands without valid pixels
+    """
+    vmin = np.full(len(bands), np.nan)
+    vmax = np.full(len(bands), np.nan)
+    for i, band in enumerate(bands):
+        band_stats = (stats or {}).get(band, {})
+        if method == "percentile":
+            stored = band_stats.get("percentiles", {})
+            if lower in stored and upper in stored:
+                vmin[i], vmax[i] = stored[lower], stored[upper]
+                continue
+        elif "min" in band_stats and "max" in band_stats:
+            vmin[i], vmax[i] = band_stats["min"], band_stats["max"]
+            continue
+        if method == "min-max" and display is not None:
+            # the display array is small and already in memory
+            vmin[i], vmax[i] = (r[0] for r in band_range(display[i : i + 1]))
+            continue
+        cache_key = None if key is None else (key, band, method, lower, upper)
+        with __STRETCH_CACHE_LOCK:
+            cached = __STRETCH_CACHE.get(cache_key)
+            if cached is not None:
+                __STRETCH_CACHE.move_to_end(cache_key)
+        if cached is None:
+            values = sample_band(im_data, band, nodata, mask)
+            if len(values) == 0:
+                cached = (np.nan, np.nan)
+            elif method == "percentile":
+                cached = tuple(np.percentile(values, [lower, upper]))
+            else:
+                cached = (values.min(), values.max())
+            if cache_key is not None:
+                with __STRETCH_CACHE_LOCK:
+                    __STRETCH_CACHE[cache_key] = cached
+                    while len(__STRETCH_CACHE) > __STRETCH_CACHE_SIZE:
+                        __STRETCH_CACHE.popitem(last=False)
+        vmin[i], vmax[i] = cached
+    return vmin, vmax
+
+
+############################################
+# Rendered view cache
+############################################
+
+
+def view_cache_dir() -> str:
+    """
+    Returns the directory of the rendered view cache which is shared by all views.
+    """
+    return os.path.join(tempfile.gettempdir(), "knime_geoimage_views")
+
+
+def view_cache_key(key: str, settings: tuple) -> str:
+    """
+    Returns the cache key of a view of the payload with the given payload key rendered with the settings.
+    """
+    view_key = hashlib.blake2b(key.encode(), digest_size=16)
+    view_key.update(repr(settings).encode())
+    return view_key.hexdigest()
+
+
+def read_view_cache(cache_dir: str, key: str):
+    """
+    Returns the cached rendering of the key or None. Reading a rendering marks it as recently used.
+    """
+    path = os.path.join(cache_dir, key)
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+        os.utime(path)
+    except OSError:
+        return None
+    return data
+
+
+def write_view_cache(cache_dir: str, key: str, data: bytes, max_size: int) -> None:
+    """
+    Stores the rendering of the key and evicts the least recently used renderings until the cache holds at
+    most max_size bytes. Renderings are written to a temporary file first, so concurrent executions never
+    read partial files. Failing to write the cache does not fail the view.
+    """
+    if max_size <= 0 or len(data) > max_size:
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, key)
+        with tempfile.NamedTemporaryFile(
+            dir=cache_dir, suffix=".tmp", delete=False
+        ) as file:
+            file.write(data)
+        os.replace(file.name, path)
+        evict_least_recently_used(cache_dir, max_size, path)
+    except OSError as error:
+        LOGGER.warning(f"Could not write the view cache: {error}")
+
+
+# cache entries are named by their hexadecimal key, other files in a cache directory are never removed
+__CACHE_ENTRY_NAME = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _entry_size(entry) -> int:
+    if not entry.is_dir(follow_symlinks=False):
+        return entry.stat(follow_symlinks=False).st_size
+    size = 0
+    for root, _, files in os.walk(entry.path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def evict_least_recently_used(cache_dir: str, max_size: int, keep: str = None) -> None:
+    """
+    Removes the least recently used entries of the cache directory until it holds at most max_size bytes.
+    Entries are files or directories named by their cache key whose modification time is updated whenever
+    they are used. The keep entry e.g. the one that was just written is never removed.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not __CACHE_ENTRY_NAME.match(entry.name):
+            continue
+        try:
+            entries.append((entry.stat().st_mtime, _entry_size(entry), entry))
+        except OSError:
+            # removed by a concurrent eviction
+            continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries, key=lambda e: e[0]):
+        if total <= max_size:
+            break
+        if entry.path == keep:
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        total -= size
+
+
+############################################
+# PNG encoding
+############################################
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+    )
+
+
+def encode_png(image: np.ndarray, compression: int = 6) -> bytes:
+    """
+    Encodes the uint8 (height, width, 3 or 4) RGB or RGBA array as PNG. Every scanline uses the up filter
+    which is computed for all rows at once and compresses smooth images well. The compression level
+    (0-9) trades the encoding time against the size.
+    """
+    height, width, channels = image.shape
+    color_type = 6 if channels == 4 else 2
+    rows = np.empty((height, width * channels + 1), dtype=np.uint8)
+    # filter type 2 (up) stores the difference to the previous scanline
+    rows[:, 0] = 2
+    flat = image.reshape(height, width * channels)
+    rows[0, 1:] = flat[0]
+    np.subtract(flat[1:], flat[:-1], out=rows[1:, 1:])
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            _png_chunk(b"IHDR", header),
+            _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), compression)),
+            _png_chunk(b"IEND", b""),
+        ]
+    )
+
+
+def png_data_url(png: bytes) -> str:
+    """
+    Returns the PNG as data URL that can be embedded into HTML.
+    """
+    return "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+
+
+############################################
+# Web Mercator tile pyramid
+############################################
+
+TILE_SIZE = 256
+"""Size of the XYZ tiles in pixels."""
+
+# half of the circumference of the Web Mercator world
+__ORIGIN_SHIFT = np.pi * 6378137.0
+
+
+def tile_bounds(x: int, y: int, zoom: int):
+    """
+    Returns the (left, bottom, right, top) bounds of the XYZ tile in EPSG:3857.
+    """
+    size = 2 * __ORIGIN_SHIFT / 2**zoom
+    left = -__ORIGIN_SHIFT + x * size
+    top = __ORIGIN_SHIFT - y * size
+    return left, top - size, left + size, top
+
+
+def tile_range(bounds, zoom: int):
+    """
+    Returns the (x, y) ranges of the XYZ tiles that cover the (left, bottom, right, top) EPSG:3857 bounds.
+    """
+    left, bottom, right, top = bounds
+    count = 2**zoom
+    size = 2 * __ORIGIN_SHIFT / count
+
+    def index(value):
+        return min(max(int(np.floor(value / size)), 0), count - 1)
+
+    return (
+        range(index(left + __ORIGIN_SHIFT), index(right + __ORIGIN_SHIFT) + 1),
+        range(index(__ORIGIN_SHIFT - top), index(__ORIGIN_SHIFT - bottom) + 1),
+    )
+
+
+def native_zoom(bounds, width: int, max_zoom: int = 22) -> int:
+    """
+    Returns the smallest zoom level whose tile pixels are at least as fine as the pixels of a raster with the
+    given EPSG:3857 bounds and width.
+    """
+    resolution = (bounds[2] - bounds[0]) / width
+    zoom = int(np.ceil(np.log2(2 * __ORIGIN_SHIFT / TILE_SIZE / resolution)))
+    return min(max(zoom, 0), max_zoom)
+
+
+def build_tile_pyramid(
+    im_data: np.ndarray,
+    bands: List[int],
+    profile,
+    mask: np.ndarray,
+    vmin: np.ndarray,
+    vmax: np.ndarray,
+    color_map: str,
+    tile_dir: str,
+    min_zoom: int,
+    max_zoom: int,
+    downsampling: str = "average",
+    num_threads: int = 0,
+    exec_context=None,
+    compression: int = 6,
+) -> int:
+    """
+    Renders the selected bands as colored XYZ PNG tiles {tile_dir}/{z}/{x}/{y}.png in EPSG:3857 for all
+    zoom levels between min_zoom and max_zoom. Each zoom level warps its tiles in parallel from the
+    coarsest power of two downsampling of the raster that is still at least as fine as the tiles, so the
+    cost per tile does not depend on the size of the raster. Tiles without valid pixels are not written.
+    @return: the number of written tiles
+    """
+    from rasterio.enums import Resampling
+    from rasterio.transform import from_bounds
+    from rasterio.warp import reproject
+    from rasterio.warp import transform_bounds
+
+    height, width = im_data.shape[-2:]
+    nodata = profile.get("nodata")
+    mercator_bounds = transform_bounds(
+        profile["crs"],
+        "EPSG:3857",
+        *rut.bounds_from_transform(profile["transform"], width, height),
+    )
+    resolution = (mercator_bounds[2] - mercator_bounds[0]) / width
+    levels = {}
+    written = 0
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        tile_resolution = 2 * __ORIGIN_SHIFT / TILE_SIZE / 2**zoom
+        factor = 2 ** max(int(np.floor(np.log2(tile_resolution / resolution))), 0)
+        if factor not in levels:
+            if factor == 1:
+                source, source_nodata = rut.mask_to_nodata(im_data, nodata, mask)
+                levels[factor] = ([source[b] for b in bands], source_nodata)
+            else:
+                levels[factor] = (
+                    list(
+                        downsample(
+                            im_data,
+                            bands,
+                            factor,
+                            downsampling,
+                            nodata,
+                            mask,
+                            num_threads,
+                        )
+                    ),
+                    np.nan,
+                )
+        sources, source_nodata = levels[factor]
+        source_transform = display_transform(profile["transform"], factor)
+        xs, ys = tile_range(mercator_bounds, zoom)
+
+        def render_tile(tile):
+            x, y = tile
+            tile_data = np.full((len(sources), TILE_SIZE, TILE_SIZE), np.nan)
+            for source, target in zip(sources, tile_data):
+                reproject(
+                    source=source,
+                    destination=target,
+                    src_transform=source_transform,
+                    src_crs=profile["crs"],
+                    src_nodata=source_nodata,
+                    dst_transform=from_bounds(
+                        *tile_bounds(x, y, zoom), TILE_SIZE, TILE_SIZE
+                    ),
+                    dst_crs="EPSG:3857",
+                    dst_nodata=np.nan,
+                    resampling=Resampling.nearest,
+                    num_threads=1,
+                )
+            if np.isnan(tile_data).all():
+                return False
+            path = os.path.join(tile_dir, str(zoom), str(x))
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, f"{y}.png"), "wb") as file:
+                file.write(
+                    encode_png(colorize(tile_data, vmin, vmax, color_map), compression)
+                )
+            return True
+
+        tiles = [(x, y) for x in xs for y in ys]
+        results = tiling.run_tiles(
+            render_tile,
+            tiles,
+            exec_context=exec_context,
+            num_threads=num_threads,
+            progress_start=0.2 + 0.7 * (zoom - min_zoom) / (max_zoom - min_zoom + 1),
+            progress_end=0.2 + 0.7 * (zoom - min_zoom + 1) / (max_zoom - min_zoom + 1),
+            message=f"Rendered zoom level {zoom} tile",
+        )
+        written += sum(results)
+    return written
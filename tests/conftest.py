@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the extension modules are imported relative to the source folder like KNIME does
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), os.pardir, "knime_extension", "src")
+)
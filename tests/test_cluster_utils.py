@@ -0,0 +1,22 @@
+import numpy as np
+
+import util.cluster_utils as clut
+
+
+def test_squared_distances_are_not_negative():
+    rng = np.random.default_rng(0)
+    pixels = rng.random((100, 4)) * 1e4
+    distances = clut.squared_distances(pixels, pixels[:10])
+    assert (distances >= 0).all()
+    np.testing.assert_allclose(distances[np.arange(10), np.arange(10)], 0, atol=1e-6)
+
+
+def test_fit_kmeans_with_near_duplicate_pixels():
+    # the distances of near duplicates to their center cancel to tiny negative values without clamping
+    for seed in range(10):
+        rng = np.random.default_rng(seed)
+        centers = rng.random((5, 4)) * 1e4
+        pixels = np.repeat(centers, 400, axis=0) + rng.random((2000, 4)) * 1e-6
+        fitted = clut.fit_kmeans(pixels, 8, seed=seed)
+        assert fitted.shape == (8, 4)
+        assert np.isfinite(fitted).all()
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+import util.focal_utils as fut
+
+
+def _reference_median(padded, size):
+    radius = size // 2
+    height = padded.shape[0] - 2 * radius
+    width = padded.shape[1] - 2 * radius
+    result = np.empty((height, width))
+    for row in range(height):
+        for col in range(width):
+            result[row, col] = np.nanmedian(padded[row : row + size, col : col + size])
+    return result
+
+
+@pytest.mark.parametrize("block_values", [1, 50, 4 * 1024 * 1024])
+def test_median_in_blocks_matches_reference(monkeypatch, block_values):
+    monkeypatch.setattr(fut, "__MEDIAN_BLOCK_VALUES", block_values)
+    rng = np.random.default_rng(0)
+    padded = rng.random((40, 33))
+    padded[5, 7] = np.nan
+    result = fut.focal_filter(padded, "median", 5)
+    expected = _reference_median(padded, 5)
+    # pixels that are invalid themselves stay invalid
+    expected[3, 5] = np.nan
+    np.testing.assert_allclose(result, expected)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import util.raster_utils as rut
+
+pytest.importorskip("rasterio")
+
+
+def _polygonize(band, connectivity, tile_size):
+    height, width = band.shape
+    final = []
+    seam = []
+    for window in rut.block_windows(height, width, tile_size):
+        tile_final, tile_seam = rut.polygonize_tile(
+            band, window, height, width, connectivity=connectivity
+        )
+        final.extend(tile_final)
+        seam.extend(tile_seam)
+    return final + rut.merge_seam_polygons(seam, connectivity)
+
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+def test_tiled_polygonize_matches_single_pass(connectivity):
+    rng = np.random.default_rng(42)
+    band = rng.integers(0, 3, (200, 200)).astype(np.int32)
+    tiled = _polygonize(band, connectivity, 64)
+    single = _polygonize(band, connectivity, 200)
+    assert len(tiled) == len(single)
+    assert sorted((value, polygon.area) for polygon, value in tiled) == sorted(
+        (value, polygon.area) for polygon, value in single
+    )
+
+
+@pytest.mark.parametrize("use_numexpr", [True, False])
+def test_band_expression_tests_bit_flags_of_integer_bands(monkeypatch, use_numexpr):
+    if use_numexpr:
+        pytest.importorskip("numexpr")
+    else:
+        monkeypatch.setattr(rut, "has_numexpr", lambda: False)
+    chunk = np.arange(48, dtype=np.uint16).reshape(3, 4, 4)
+    result = rut.evaluate_band_expression("(B1 & 8) > 0", chunk)
+    np.testing.assert_array_equal(result, ((chunk[0] & 8) > 0).astype(np.float32))
+    # the same band can be used as float value and as bit flags
+    result = rut.evaluate_band_expression("where((B2 & 3) == 1, B1 / 2, B3 | 1)", chunk)
+    expected = np.where((chunk[1] & 3) == 1, chunk[0] / 2, chunk[2] | 1)
+    np.testing.assert_allclose(result, expected.astype(np.float32))
+    result = rut.evaluate_band_expression("~(B1 > 5) & (B2 < 30)", chunk)
+    np.testing.assert_array_equal(
+        result, (~(chunk[0] > 5) & (chunk[1] < 30)).astype(np.float32)
+    )
+
+
+@pytest.mark.parametrize(
+    "expression", ["B1 & 1.5", "(B1 / 2) & 1", "B1 & (B2 > 0)", "~B1"]
+)
+def test_band_expression_rejects_invalid_bitwise_operands(expression):
+    with pytest.raises(ValueError):
+        rut.parse_band_expression(expression, 2)
+
+
+def test_band_expression_rejects_bit_flags_of_float_rasters():
+    with pytest.raises(ValueError):
+        rut.parse_band_expression("B1 & 8", 1, np.float32)
+    assert rut.parse_band_expression("(B1 > 0) | (B1 < -5)", 1, np.float32) == [1]
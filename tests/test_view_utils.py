@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import pytest
+
+# the view utils need the KNIME Python API through the tiling engine
+pytest.importorskip("util.knime_utils")
+pytest.importorskip("rasterio")
+
+import util.raster_utils as rut  # noqa: E402
+import util.view_utils as vut  # noqa: E402
+
+
+def _large_payload(seed=0):
+    rng = np.random.default_rng(seed)
+    # larger than any block size so every part of the payload has to be hashed
+    im_data = rng.integers(0, 1000, (1, 4096, 4096), dtype=np.int32)
+    profile = {"nodata": None, "height": 4096, "width": 4096, "count": 1}
+    return im_data, profile
+
+
+def test_payload_key_detects_single_pixel_changes():
+    im_data, profile = _large_payload()
+    keys = {vut.payload_key(rut.dump_raster(im_data, profile, (0, 0, 1, 1)))}
+    rng = np.random.default_rng(1)
+    for row, col in rng.integers(0, 4096, (20, 2)):
+        edited = im_data.copy()
+        edited[0, row, col] += 1
+        keys.add(vut.payload_key(rut.dump_raster(edited, profile, (0, 0, 1, 1))))
+    assert len(keys) == 21
+
+
+def test_view_cache_misses_after_single_pixel_edit(tmp_path):
+    im_data, profile = _large_payload()
+    settings = ("GeoImageView", "1", "viridis", 0.7, "OpenStreetMap")
+    payload = rut.dump_raster(im_data, profile, (0, 0, 1, 1))
+    key = vut.view_cache_key(vut.payload_key(payload), settings)
+    vut.write_view_cache(str(tmp_path), key, b"<html></html>", 1024**2)
+    assert vut.read_view_cache(str(tmp_path), key) == b"<html></html>"
+
+    im_data[0, 4000, 17] += 1
+    edited = rut.dump_raster(im_data, profile, (0, 0, 1, 1))
+    edited_key = vut.view_cache_key(vut.payload_key(edited), settings)
+    assert edited_key != key
+    assert vut.read_view_cache(str(tmp_path), edited_key) is None
+
+
+def test_view_cache_evicts_least_recently_used(tmp_path):
+    keys = [f"{i:032x}" for i in range(5)]
+    for i, key in enumerate(keys[:4]):
+        vut.write_view_cache(str(tmp_path), key, b"x" * 300, 1000)
+        # distinct modification times
+        os.utime(tmp_path / key, (i, i))
+    vut.read_view_cache(str(tmp_path), keys[1])
+    vut.write_view_cache(str(tmp_path), keys[4], b"x" * 300, 1000)
+    assert sorted(os.listdir(tmp_path)) == [keys[1], keys[3], keys[4]]
+
+
+def test_evict_least_recently_used_removes_whole_tile_pyramids(tmp_path):
+    for i, key in enumerate(["a" * 32, "b" * 32, "c" * 32]):
+        tiles = tmp_path / key / "5" / "3"
+        tiles.mkdir(parents=True)
+        (tiles / "7.png").write_bytes(b"x" * 400)
+        os.utime(tmp_path / key, (i, i))
+    # files that are not cache entries are kept
+    (tmp_path / "notes.txt").write_bytes(b"x" * 1000)
+    vut.evict_least_recently_used(str(tmp_path), 1000, str(tmp_path / ("a" * 32)))
+    assert sorted(os.listdir(tmp_path)) == ["a" * 32, "c" * 32, "notes.txt"]